@@ -0,0 +1,546 @@
+"""
+SQLite API response cache shared by generate-geojson.py and generate-bus-stops.py.
+
+The database (api_cache.db) runs in WAL mode so readers never block the writer.
+Each thread keeps one persistent connection, and writes are buffered and committed
+in batches inside a single transaction. Buffered writes stay visible to readers
+until they are committed.
+
+An in-process LRU of encoded responses sits in front of SQLite; warm_cache()
+bulk-loads every usable entry for the endpoints a run uses in one query, so
+a warm run rarely touches the database row by row.
+
+Responses are projected down to the fields the scripts read (RESPONSE_FIELDS) and
+stored as zlib-compressed compact JSON. Databases in older formats are migrated in
+place by init_cache_db().
+
+Date fields of the timetable requests are left out of their cache keys
+(VOLATILE_REQUEST_FIELDS), so those entries stay valid across days.
+Entries expire per endpoint (CACHE_TTL_HOURS); failed responses use the shorter
+CACHE_FAILURE_TTL_HOURS. With stale-while-revalidate enabled, an expired success
+younger than its TTL + CACHE_STALE_MAX_HOURS is returned at once and refreshed in
+the background.
+"""
+
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# ──────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────
+
+CACHE_DB_PATH = 'api_cache.db'
+CACHE_DURATION_HOURS = 24   # TTL for endpoints not listed in CACHE_TTL_HOURS
+WRITE_BATCH_SIZE = 200      # Buffered writes committed per transaction
+BUSY_TIMEOUT_MS = 30000     # Wait this long for another connection's write lock
+SCHEMA_VERSION = 2          # PRAGMA user_version; 0 is the original TEXT response_data table
+COMPRESSION_LEVEL = 6
+MEMORY_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Size limit of the in-memory LRU (encoded bytes)
+
+# TTL per endpoint, keyed by cache desc prefix (desc is "<prefix>_<params>")
+CACHE_TTL_HOURS = {
+    'GetAllRouteList': 24 * 7,          # Route list barely changes
+    'SearchRoute_v2': 24 * 7,
+    'SearchByRouteDetails_v4': 24 * 3,  # Route structure
+    'timetable': 24,                    # Daily timetables
+    'GetTimetableByRouteid_v3': 24,
+    'varnam': 24 * 365,                 # Transliterations never change
+}
+CACHE_FAILURE_TTL_HOURS = 2     # Failed / exception responses, whatever the endpoint
+CACHE_STALE_MAX_HOURS = 24 * 7  # How long past its TTL a success may still be served stale
+STALE_WHILE_REVALIDATE = False
+REVALIDATE_WORKERS = 4
+
+# Request fields left out of the cache key per endpoint, keyed by cache desc prefix.
+# The timetable queries carry today's / tomorrow's date, which would otherwise make
+# every entry miss after midnight regardless of its TTL.
+VOLATILE_REQUEST_FIELDS = {
+    'timetable': ('p_startdate', 'p_enddate', 'p_date'),
+    'GetTimetableByRouteid_v3': ('starttime', 'endtime', 'current_date'),
+}
+DATE_INDEPENDENT_KEYS = True
+
+# Fields kept per endpoint, keyed by cache desc prefix.
+# A dict keeps the listed keys (recursing into their specs), a tuple keeps those keys
+# of every object in a list, and True keeps a value unchanged.
+_ROUTE_ENTRY = ('routeid', 'routeno', 'routename', 'fromstationid', 'platformname', 'platformnumber', 'baynumber')
+_STATUS = {'Issuccess': True, 'isException': True, 'exception': True, 'Message': True}
+_DIRECTION = {'data': ('stationid', 'stationname', 'centerlat', 'centerlong')}
+
+RESPONSE_FIELDS = {
+    'GetAllRouteList': {**_STATUS, 'data': ('routeid', 'routeno', 'routename', 'fromstationid', 'fromstation', 'tostation')},
+    'timetable': {**_STATUS, 'data': _ROUTE_ENTRY},
+    'GetTimetableByRouteid_v3': {**_STATUS, 'data': _ROUTE_ENTRY},
+    'SearchRoute_v2': {**_STATUS, 'data': ('routeno', 'routeparentid')},
+    'SearchByRouteDetails_v4': {'up': _DIRECTION, 'down': _DIRECTION},
+    'varnam': {'result': True},
+}
+
+
+def configure(stale_while_revalidate=None, date_independent_keys=None):
+    global STALE_WHILE_REVALIDATE, DATE_INDEPENDENT_KEYS
+    if stale_while_revalidate is not None:
+        STALE_WHILE_REVALIDATE = stale_while_revalidate
+    if date_independent_keys is not None:
+        DATE_INDEPENDENT_KEYS = date_independent_keys
+
+
+# ──────────────────────────────────────────────
+# Connections
+# ──────────────────────────────────────────────
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+_pending = {}               # cache_key -> (desc, entry), not yet committed
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+_memory = OrderedDict()     # cache_key -> entry, least recently used first
+_memory_bytes = 0
+_memory_lock = threading.Lock()
+
+_revalidator = None
+_revalidating = set()       # cache keys with a background refresh queued or running
+_revalidator_lock = threading.Lock()
+
+
+def get_connection():
+    """Return this thread's persistent connection to the cache database."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def _create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_cache (
+            request_hash TEXT PRIMARY KEY,
+            request_desc TEXT NOT NULL,
+            response BLOB NOT NULL,
+            is_failure INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_api_cache_created_at ON api_cache (created_at)')
+
+
+def _migrate_text_cache(conn):
+    """Convert an original-format cache (full JSON text per row) to projected, compressed rows."""
+    print('Migrating api_cache.db to compressed storage...')
+    with conn:
+        conn.execute('ALTER TABLE api_cache RENAME TO api_cache_text')
+        conn.execute('DROP INDEX IF EXISTS idx_api_cache_created_at')
+        _create_tables(conn)
+        rows = conn.execute('SELECT request_hash, request_desc, response_data, created_at FROM api_cache_text')
+        migrated = 0
+        for request_hash, desc, response_data, created_at in rows.fetchall():
+            try:
+                response = project_response(desc, json.loads(response_data))
+            except ValueError:
+                continue
+            conn.execute(
+                'INSERT OR REPLACE INTO api_cache (request_hash, request_desc, response, is_failure, created_at) VALUES (?, ?, ?, ?, ?)',
+                (request_hash, desc, encode_response(desc, response), int(is_failure_response(response)), created_at)
+            )
+            migrated += 1
+        conn.execute('DROP TABLE api_cache_text')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.execute('VACUUM')
+    print(f'  Migrated {migrated} cache entries')
+
+
+def _migrate_failure_flags(conn):
+    """Add the is_failure column to a version 1 (compressed, unflagged) cache."""
+    with conn:
+        conn.execute('ALTER TABLE api_cache ADD COLUMN is_failure INTEGER NOT NULL DEFAULT 0')
+        rows = conn.execute('SELECT request_hash, response FROM api_cache').fetchall()
+        conn.executemany(
+            'UPDATE api_cache SET is_failure = 1 WHERE request_hash = ?',
+            [(request_hash,) for request_hash, blob in rows if is_failure_response(decode_response(blob))]
+        )
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def init_cache_db():
+    conn = get_connection()
+    conn.execute('PRAGMA journal_mode = WAL')
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(api_cache)')}
+    if 'response_data' in columns:
+        _migrate_text_cache(conn)
+    elif columns and 'is_failure' not in columns:
+        _migrate_failure_flags(conn)
+    elif version < SCHEMA_VERSION:
+        _create_tables(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+
+
+def close():
+    """Finish background refreshes, commit buffered writes and close every connection."""
+    global _revalidator
+    with _revalidator_lock:
+        revalidator, _revalidator = _revalidator, None
+    if revalidator is not None:
+        revalidator.shutdown(wait=True)
+    flush()
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+
+
+atexit.register(close)
+
+
+# ──────────────────────────────────────────────
+# Response projection, encoding and expiry
+# ──────────────────────────────────────────────
+
+def _project(value, spec):
+    if spec is True:
+        return value
+    if isinstance(spec, tuple):
+        if not isinstance(value, list):
+            return value
+        return [
+            {k: item[k] for k in spec if k in item} if isinstance(item, dict) else item
+            for item in value
+        ]
+    if not isinstance(value, dict):
+        return value
+    return {k: _project(value[k], sub_spec) for k, sub_spec in spec.items() if k in value}
+
+
+def _endpoint(desc, table):
+    for prefix in table:
+        if desc.startswith(f'{prefix}_'):
+            return prefix
+    return None
+
+
+def project_response(desc, response_data):
+    """Strip a response down to the fields listed for its endpoint in RESPONSE_FIELDS."""
+    prefix = _endpoint(desc, RESPONSE_FIELDS)
+    if prefix is None:
+        return response_data
+    return _project(response_data, RESPONSE_FIELDS[prefix])
+
+
+def is_failure_response(response_data):
+    """True for empty responses and BMTC responses flagged as exceptions / not successful."""
+    if not response_data:
+        return True
+    if not isinstance(response_data, dict):
+        return False
+    return (
+        response_data.get('exception') not in (None, False) or
+        response_data.get('isException') is True or
+        ('Issuccess' in response_data and response_data.get('Issuccess') is not True)
+    )
+
+
+def ttl_hours(desc, is_failure=False):
+    prefix = _endpoint(desc, CACHE_TTL_HOURS)
+    ttl = CACHE_TTL_HOURS[prefix] if prefix is not None else CACHE_DURATION_HOURS
+    return min(ttl, CACHE_FAILURE_TTL_HOURS) if is_failure else ttl
+
+
+def _freshness(desc, entry):
+    """'fresh', 'stale' (servable under stale-while-revalidate) or None if unusable."""
+    _, created_ts, is_failure = entry
+    age_hours = (time.time() - created_ts) / 3600
+    ttl = ttl_hours(desc, is_failure)
+    if age_hours < ttl:
+        return 'fresh'
+    if not is_failure and age_hours < ttl + CACHE_STALE_MAX_HOURS:
+        return 'stale'
+    return None
+
+
+def encode_response(desc, response_data):
+    data = json.dumps(project_response(desc, response_data), ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(data.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decode_response(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+# ──────────────────────────────────────────────
+# In-memory LRU
+# ──────────────────────────────────────────────
+
+def _memory_get(cache_key):
+    with _memory_lock:
+        entry = _memory.get(cache_key)
+        if entry is not None:
+            _memory.move_to_end(cache_key)
+        return entry
+
+
+def _memory_put(cache_key, entry):
+    global _memory_bytes
+    with _memory_lock:
+        old = _memory.pop(cache_key, None)
+        if old is not None:
+            _memory_bytes -= len(old[0])
+        _memory[cache_key] = entry
+        _memory_bytes += len(entry[0])
+        while _memory_bytes > MEMORY_CACHE_MAX_BYTES and _memory:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted[0])
+
+
+def _like_patterns(desc_prefixes):
+    """SQL clause and parameters matching request_desc against '<prefix>_%' for each prefix."""
+    clause = ' OR '.join("request_desc LIKE ? ESCAPE '!'" for _ in desc_prefixes)
+    patterns = [prefix.replace('!', '!!').replace('_', '!_').replace('%', '!%') + '!_%' for prefix in desc_prefixes]
+    return clause, patterns
+
+
+def warm_cache(desc_prefixes):
+    """Bulk-load usable entries whose desc starts with one of desc_prefixes into memory."""
+    if not desc_prefixes:
+        return 0
+    like, patterns = _like_patterns(desc_prefixes)
+    try:
+        rows = get_connection().execute(
+            f"SELECT request_hash, request_desc, response, CAST(strftime('%s', created_at) AS INTEGER), is_failure FROM api_cache WHERE {like}",
+            patterns
+        ).fetchall()
+    except Exception as e:
+        print(f'  cache warm-up error: {e}')
+        return 0
+
+    loaded = 0
+    for cache_key, desc, blob, created_ts, is_failure in rows:
+        entry = (blob, created_ts, bool(is_failure))
+        if _freshness(desc, entry) is not None:
+            _memory_put(cache_key, entry)
+            loaded += 1
+    print(f'Warmed in-memory cache with {loaded} entries')
+    return loaded
+
+
+# ──────────────────────────────────────────────
+# Reads and writes
+# ──────────────────────────────────────────────
+
+def canonical_request(desc, request_data):
+    """Request data as hashed into the cache key, without the endpoint's volatile fields."""
+    prefix = _endpoint(desc, VOLATILE_REQUEST_FIELDS) if DATE_INDEPENDENT_KEYS else None
+    if prefix is None:
+        return request_data
+    try:
+        fields = json.loads(request_data)
+    except ValueError:
+        return request_data
+    if not isinstance(fields, dict):
+        return request_data
+    for field in VOLATILE_REQUEST_FIELDS[prefix]:
+        fields.pop(field, None)
+    return json.dumps(fields, sort_keys=True)
+
+
+def get_cache_key(desc, request_data):
+    request_string = f"{desc}:{canonical_request(desc, request_data)}"
+    return hashlib.md5(request_string.encode()).hexdigest()
+
+
+def _lookup(desc, cache_key):
+    """Return (response, freshness) for a cache key, or (None, None) on a miss."""
+    with _pending_lock:
+        pending = _pending.get(cache_key)
+    entry = pending[1] if pending is not None else _memory_get(cache_key)
+
+    if entry is None:
+        try:
+            row = get_connection().execute(
+                "SELECT response, CAST(strftime('%s', created_at) AS INTEGER), is_failure FROM api_cache WHERE request_hash = ?",
+                (cache_key,)
+            ).fetchone()
+        except Exception as e:
+            print(f'  cache error: {e}')
+            return None, None
+        if row is None:
+            return None, None
+        entry = (row[0], row[1], bool(row[2]))
+        _memory_put(cache_key, entry)
+
+    freshness = _freshness(desc, entry)
+    if freshness is None:
+        return None, None
+    return decode_response(entry[0]), freshness
+
+
+def get_cached_response(desc, request_data, allow_stale=False):
+    response, freshness = _lookup(desc, get_cache_key(desc, request_data))
+    if freshness == 'fresh' or (freshness == 'stale' and allow_stale):
+        return response
+    return None
+
+
+def store_cached_response(desc, request_data, response_data):
+    cache_key = get_cache_key(desc, request_data)
+    entry = (encode_response(desc, response_data), int(time.time()), is_failure_response(response_data))
+    _memory_put(cache_key, entry)
+    with _pending_lock:
+        _pending[cache_key] = (desc, entry)
+        full = len(_pending) >= WRITE_BATCH_SIZE
+    if full:
+        flush()
+
+
+def flush():
+    """Commit all buffered writes in one transaction."""
+    with _flush_lock:
+        with _pending_lock:
+            batch = dict(_pending)
+        if not batch:
+            return
+
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO api_cache (request_hash, request_desc, response, is_failure, created_at) VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'))",
+                    [
+                        (cache_key, desc, blob, int(is_failure), created_ts)
+                        for cache_key, (desc, (blob, created_ts, is_failure)) in batch.items()
+                    ]
+                )
+        except Exception as e:
+            print(f'  cache store error: {e}')
+            return
+
+        # Drop committed entries unless they were overwritten while we were writing
+        with _pending_lock:
+            for cache_key, entry in batch.items():
+                if _pending.get(cache_key) is entry:
+                    del _pending[cache_key]
+
+
+def cleanup_expired_cache():
+    """Delete entries past their TTL.
+
+    Successes are kept for CACHE_STALE_MAX_HOURS longer when stale-while-revalidate
+    is on, since only then can they still be served.
+    """
+    grace = CACHE_STALE_MAX_HOURS if STALE_WHILE_REVALIDATE else 0
+    try:
+        conn = get_connection()
+        deleted = 0
+        with conn:
+            for prefix, ttl in CACHE_TTL_HOURS.items():
+                like, patterns = _like_patterns([prefix])
+                deleted += conn.execute(
+                    f"DELETE FROM api_cache WHERE ({like}) AND created_at <= datetime('now', '-{ttl + grace} hours')",
+                    patterns
+                ).rowcount
+            like, patterns = _like_patterns(list(CACHE_TTL_HOURS))
+            deleted += conn.execute(
+                f"DELETE FROM api_cache WHERE NOT ({like}) AND created_at <= datetime('now', '-{CACHE_DURATION_HOURS + grace} hours')",
+                patterns
+            ).rowcount
+            deleted += conn.execute(
+                f"DELETE FROM api_cache WHERE is_failure = 1 AND created_at <= datetime('now', '-{CACHE_FAILURE_TTL_HOURS} hours')"
+            ).rowcount
+        if deleted > 0:
+            print(f'Cleaned up {deleted} expired cache entries')
+    except Exception as e:
+        print(f'Cache cleanup error: {e}')
+
+
+def count_entries():
+    flush()
+    return get_connection().execute('SELECT COUNT(*) FROM api_cache').fetchone()[0]
+
+
+# ──────────────────────────────────────────────
+# Single-flight fetches
+# ──────────────────────────────────────────────
+
+# In-flight / completed requests for this run, keyed by cache key
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _revalidate(cache_key, desc, request_data, fetch):
+    """Background refresh of a stale entry. Failures leave the stale success in place."""
+    try:
+        response = project_response(desc, fetch())
+    except Exception as e:
+        print(f'  revalidation error for {desc}: {e}')
+    else:
+        if not is_failure_response(response):
+            store_cached_response(desc, request_data, response)
+    finally:
+        with _revalidator_lock:
+            _revalidating.discard(cache_key)
+
+
+def _schedule_revalidation(cache_key, desc, request_data, fetch):
+    """Queue a background refresh unless one is already pending for cache_key."""
+    global _revalidator
+    with _revalidator_lock:
+        if cache_key in _revalidating:
+            return
+        if _revalidator is None:
+            _revalidator = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS)
+        _revalidating.add(cache_key)
+        _revalidator.submit(_revalidate, cache_key, desc, request_data, fetch)
+
+
+def fetch_cached(desc, request_data, fetch):
+    """Return the cached response for (desc, request_data), calling fetch() on a miss.
+
+    Requests are single-flight: concurrent callers for the same cache key wait on the
+    first caller's lookup instead of repeating it; once it completes, later callers
+    go through the cache as usual. fetch() returns the response to cache, or raises
+    to leave it uncached (the exception is re-raised to the callers waiting on that
+    fetch only, so a later call retries).
+    Under STALE_WHILE_REVALIDATE a stale entry is returned immediately and fetch()
+    runs in the background to refresh it, at most once at a time per cache key.
+    """
+    cache_key = get_cache_key(desc, request_data)
+    with _inflight_lock:
+        future = _inflight.get(cache_key)
+        owner = future is None
+        if owner:
+            future = _inflight[cache_key] = Future()
+    if not owner:
+        return future.result()
+
+    try:
+        response, freshness = _lookup(desc, cache_key)
+        if freshness == 'stale' and STALE_WHILE_REVALIDATE:
+            _schedule_revalidation(cache_key, desc, request_data, fetch)
+        elif freshness != 'fresh':
+            response = project_response(desc, fetch())
+            store_cached_response(desc, request_data, response)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(response)
+    finally:
+        with _inflight_lock:
+            del _inflight[cache_key]
+    return response
@@ -0,0 +1,132 @@
+"""
+Shared HTTP client for the BMTC mobile API and the Varnam transliteration API.
+
+Used by generate-geojson.py and generate-bus-stops.py. Each thread gets its own
+keep-alive requests.Session (sessions are not shared across threads), so repeated
+calls to bmtcmobileapi.karnataka.gov.in reuse TCP/TLS connections instead of
+paying a new handshake per request. A thread sends one request at a time, so its
+session keeps a single connection per host; overall connection reuse scales with
+the number of worker threads. Connection errors and timeouts are retried with
+exponential backoff.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ──────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────
+
+API_URL = 'https://bmtcmobileapi.karnataka.gov.in/WebAPI/'
+VARNAM_API_URL = 'https://api.varnamproject.com/tl/kn/{word}'
+
+REQUEST_HEADERS_EN = {
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Content-Type': 'application/json',
+    'lan': 'en',
+    'deviceType': 'WEB',
+    'Origin': 'https://bmtcwebportal.amnex.com',
+    'Referer': 'https://bmtcwebportal.amnex.com/',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+REQUEST_HEADERS_KN = {
+    **REQUEST_HEADERS_EN,
+    'lan': 'kn',
+}
+
+MAX_RETRIES = 3             # Retries after the first attempt on connection errors / timeouts
+RETRY_BACKOFF_SECONDS = 0.5  # Sleep before retry n is RETRY_BACKOFF_SECONDS * 2 ** n
+DEFAULT_TIMEOUT = 30
+
+# ──────────────────────────────────────────────
+# Sessions
+# ──────────────────────────────────────────────
+
+_local = threading.local()
+_listeners = []
+
+
+def configure(max_retries=None, backoff_seconds=None):
+    """Override retry settings."""
+    global MAX_RETRIES, RETRY_BACKOFF_SECONDS
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if backoff_seconds is not None:
+        RETRY_BACKOFF_SECONDS = backoff_seconds
+
+
+def get_session():
+    """Return this thread's keep-alive session, creating it on first use."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        # One request at a time per thread: a single kept-alive connection per host
+        adapter = HTTPAdapter(pool_maxsize=1)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
+
+
+def add_listener(listener):
+    """Register listener(latency_seconds, ok, endpoint) to be called after every HTTP attempt.
+
+    endpoint is the BMTC API endpoint name for post() and the host for get().
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _notify(latency, ok, endpoint):
+    for listener in list(_listeners):
+        listener(latency, ok, endpoint)
+
+
+def _request(method, url, endpoint, timeout=DEFAULT_TIMEOUT, deadline=None, **kwargs):
+    """Send a request with retries. deadline (a time.monotonic() value) caps each
+    attempt's timeout and the retry backoff, so the call never outlives it."""
+    for attempt in range(MAX_RETRIES + 1):
+        start = time.monotonic()
+        attempt_timeout = timeout
+        if deadline is not None:
+            if deadline - start <= 0:
+                raise requests.Timeout(f'Deadline passed before {method} {url}')
+            attempt_timeout = min(timeout, deadline - start)
+        try:
+            resp = get_session().request(method, url, timeout=attempt_timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _notify(time.monotonic() - start, False, endpoint)
+            if attempt == MAX_RETRIES:
+                raise
+            backoff = RETRY_BACKOFF_SECONDS * 2 ** attempt
+            if deadline is not None:
+                backoff = min(backoff, max(0, deadline - time.monotonic()))
+            time.sleep(backoff)
+            continue
+        _notify(time.monotonic() - start, resp.status_code < 500 and resp.status_code != 429, endpoint)
+        return resp
+
+
+# ──────────────────────────────────────────────
+# Requests
+# ──────────────────────────────────────────────
+
+def post(endpoint, data, headers=REQUEST_HEADERS_EN, timeout=DEFAULT_TIMEOUT, deadline=None):
+    """POST a JSON string to a BMTC API endpoint, e.g. post('SearchRoute_v2', data)."""
+    return _request('POST', f'{API_URL}{endpoint}', endpoint, headers=headers, data=data,
+                    timeout=timeout, deadline=deadline)
+
+
+def get(url, timeout=DEFAULT_TIMEOUT):
+    """GET an absolute URL (used for Varnam) through the pooled session."""
+    return _request('GET', url, urlsplit(url).netloc, timeout=timeout)
@@ -0,0 +1,163 @@
+"""
+Concurrent execution engine for the generate-geojson.py fetch stages.
+
+Stages hand blocking fetch callables to FetchEngine.submit() and get back
+concurrent.futures.Future objects, so the same stage code runs in either mode:
+
+- 'threads': a fixed ThreadPoolExecutor of max_workers threads.
+- 'async':   an asyncio event loop (in a background thread) that schedules the
+             callables under an AIMD concurrency limit. The limit grows by one
+             slot per window of fast, successful API calls and is cut
+             multiplicatively on errors or when an endpoint's recent latency
+             climbs well above its baseline, so it settles at what the BMTC
+             API sustains.
+
+Latency and errors are observed on the actual HTTP calls via bmtc_api listeners,
+so cache hits don't skew the limit. Each endpoint keeps its own latency baseline
+(a slow moving average, so it tracks the endpoint's normal latency and its
+jitter rather than the single fastest response), which keeps the naturally slow
+GetAllRouteList / SearchByRouteDetails calls from reading as congestion.
+"""
+
+import asyncio
+import threading
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bmtc_api
+
+# ──────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────
+
+ASYNC_INITIAL_CONCURRENCY = 4
+ASYNC_MIN_CONCURRENCY = 1
+ASYNC_MAX_CONCURRENCY = 64
+LATENCY_TOLERANCE = 2.0      # Back off when an endpoint's recent latency exceeds this multiple of its baseline
+LATENCY_SMOOTHING = 0.2      # EWMA weight of the newest sample in an endpoint's recent latency
+BASELINE_SMOOTHING = 0.02    # EWMA weight of the newest sample in an endpoint's baseline latency
+DECREASE_FACTOR = 0.7        # Multiplicative decrease applied to the limit on congestion
+
+
+# ──────────────────────────────────────────────
+# AIMD concurrency limiter
+# ──────────────────────────────────────────────
+
+class AdaptiveLimiter:
+    """Asyncio concurrency limit adjusted by additive-increase / multiplicative-decrease."""
+
+    def __init__(self, initial=ASYNC_INITIAL_CONCURRENCY, minimum=ASYNC_MIN_CONCURRENCY,
+                 maximum=ASYNC_MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.latencies = {}  # endpoint -> {'baseline', 'recent'} latency EWMAs
+        self.last_decrease = {}  # endpoint -> time of the last decrease it caused
+        self.samples = 0
+        self.errors = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter  # the slot is handed over by _wake()
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def observe(self, latency, ok, endpoint=None):
+        """Feed one HTTP call result into the limit (must run on the event loop thread)."""
+        self.samples += 1
+        stats = self.latencies.get(endpoint)
+        if ok:
+            if stats is None:
+                stats = self.latencies[endpoint] = {'baseline': latency, 'recent': latency}
+            else:
+                stats['baseline'] += BASELINE_SMOOTHING * (latency - stats['baseline'])
+                stats['recent'] += LATENCY_SMOOTHING * (latency - stats['recent'])
+            congested = stats['recent'] > stats['baseline'] * LATENCY_TOLERANCE
+        else:
+            self.errors += 1
+            congested = True
+
+        now = time.monotonic()
+        if congested:
+            # Decrease at most once per round trip of this endpoint so one burst of
+            # slow responses doesn't collapse the limit to the minimum. The cooldown
+            # is per endpoint: a backoff on one doesn't mask congestion on another.
+            if now - self.last_decrease.get(endpoint, 0.0) >= (stats['recent'] if stats else 0):
+                self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                self.last_decrease[endpoint] = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        self._wake()
+
+
+# ──────────────────────────────────────────────
+# Engine
+# ──────────────────────────────────────────────
+
+class FetchEngine:
+    """Submit blocking fetch callables; returns concurrent.futures.Future objects in both modes."""
+
+    def __init__(self, mode='threads', max_workers=10):
+        if mode not in ('threads', 'async'):
+            raise ValueError(f'Unknown fetch mode: {mode}')
+        self.mode = mode
+        self.max_workers = max_workers
+
+        if mode == 'threads':
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            return
+
+        self.limiter = AdaptiveLimiter()
+        self._executor = ThreadPoolExecutor(max_workers=self.limiter.maximum)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fetch-engine', daemon=True)
+        self._thread.start()
+        bmtc_api.add_listener(self._on_http_result)
+
+    def _on_http_result(self, latency, ok, endpoint):
+        self._loop.call_soon_threadsafe(self.limiter.observe, latency, ok, endpoint)
+
+    async def _run(self, fn, args):
+        await self.limiter.acquire()
+        try:
+            return await self._loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.limiter.release()
+
+    def submit(self, fn, *args):
+        if self.mode == 'threads':
+            return self._executor.submit(fn, *args)
+        return asyncio.run_coroutine_threadsafe(self._run(fn, args), self._loop)
+
+    def close(self):
+        if self.mode == 'async':
+            bmtc_api.remove_listener(self._on_http_result)
+            print(f'  Adaptive concurrency settled at {int(self.limiter.limit)} '
+                  f'({self.limiter.samples} API calls, {self.limiter.errors} errors)')
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -19,85 +19,18 @@ import csv
 import json
 import os
 import sys
-import hashlib
-import sqlite3
 
-import requests
+import api_cache
+import bmtc_api
+from api_cache import fetch_cached
+from route_search import fetch_route_parent_ids
 
 # ──────────────────────────────────────────────
 # Configuration
 # ──────────────────────────────────────────────
 
-API_URL = 'https://bmtcmobileapi.karnataka.gov.in/WebAPI/'
 CSV_PATH = 'input/bus-stops.csv'
 
-REQUEST_HEADERS = {
-    'Accept': 'application/json, text/plain, */*',
-    'Accept-Language': 'en-US,en;q=0.5',
-    'Content-Type': 'application/json',
-    'lan': 'en',
-    'deviceType': 'WEB',
-    'Origin': 'https://bmtcwebportal.amnex.com',
-    'Referer': 'https://bmtcwebportal.amnex.com/',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-}
-
-CACHE_DB_PATH = 'api_cache.db'
-CACHE_DURATION_HOURS = 24
-
-
-# ──────────────────────────────────────────────
-# SQLite Cache (shared with generate-geojson.py)
-# ──────────────────────────────────────────────
-
-def init_cache_db():
-    conn = sqlite3.connect(CACHE_DB_PATH)
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS api_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            request_hash TEXT UNIQUE NOT NULL,
-            request_desc TEXT NOT NULL,
-            response_data TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-
-def get_cache_key(desc, request_data):
-    return hashlib.md5(f"{desc}:{request_data}".encode()).hexdigest()
-
-
-def get_cached_response(desc, request_data):
-    try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cursor = conn.cursor()
-        cache_key = get_cache_key(desc, request_data)
-        cursor.execute(
-            f"SELECT response_data FROM api_cache WHERE request_hash = ? AND created_at > datetime('now', '-{CACHE_DURATION_HOURS} hours')",
-            (cache_key,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        return json.loads(result[0]) if result else None
-    except Exception:
-        return None
-
-
-def store_cached_response(desc, request_data, response_data):
-    try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cache_key = get_cache_key(desc, request_data)
-        conn.execute(
-            'INSERT OR REPLACE INTO api_cache (request_hash, request_desc, response_data, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
-            (cache_key, desc, json.dumps(response_data))
-        )
-        conn.commit()
-        conn.close()
-    except Exception:
-        pass
-
 
 # ──────────────────────────────────────────────
 # Route number conversion
@@ -117,87 +50,19 @@ def add_hyphens(route_number):
 # BMTC API calls
 # ──────────────────────────────────────────────
 
-def fetch_search_results(prefix):
-    """Fetch SearchRoute_v2 results for a single-character prefix. Returns list of entries."""
-    cache_desc = f'SearchRoute_v2_{prefix}'
-    cached = get_cached_response(cache_desc, prefix)
-
-    if cached is not None:
-        return cached.get('data', [])
-
-    try:
-        resp = requests.post(
-            f'{API_URL}SearchRoute_v2',
-            headers=REQUEST_HEADERS,
-            data=json.dumps({"routetext": prefix}),
-            timeout=30
-        )
-        result = resp.json()
-        store_cached_response(cache_desc, prefix, result)
-        return result.get('data', [])
-    except Exception as e:
-        print(f'    SearchRoute_v2 error for prefix "{prefix}": {e}')
-        return []
-
-
-def fetch_route_parent_ids(route_api_names):
-    """Batch-fetch routeparentids by grouping routes by first character.
-    Returns dict: route_api_name -> routeparentid."""
-    parent_ids = {}
-
-    # Group by first character
-    groups = {}
-    for name in route_api_names:
-        prefix = name[0] if name else ''
-        if prefix:
-            groups.setdefault(prefix, []).append(name)
-
-    print(f'  Querying {len(groups)} prefix groups: {sorted(groups.keys())}')
-
-    for prefix, names in groups.items():
-        data = fetch_search_results(prefix)
-
-        # Build lookup from API response
-        api_lookup = {}
-        for entry in data:
-            rn = entry.get('routeno', '').upper()
-            if rn not in api_lookup:
-                api_lookup[rn] = entry['routeparentid']
-
-        for name in names:
-            search_text = name.split(' ')[0]
-            # Exact match first
-            if name.upper() in api_lookup:
-                parent_ids[name] = api_lookup[name.upper()]
-            else:
-                # Prefix match fallback
-                for entry in data:
-                    if entry.get('routeno', '').upper().startswith(search_text.upper()):
-                        parent_ids[name] = entry['routeparentid']
-                        break
-
-    return parent_ids
-
-
 def fetch_stop_sequence(route_parent_id, stop_ids):
     """Use SearchByRouteDetails_v4 to get ordered stop names."""
-    cache_desc = f'SearchByRouteDetails_v4_{route_parent_id}'
-    cached = get_cached_response(cache_desc, str(route_parent_id))
-
-    if cached is not None:
-        result = cached
-    else:
-        try:
-            resp = requests.post(
-                f'{API_URL}SearchByRouteDetails_v4',
-                headers=REQUEST_HEADERS,
-                data=json.dumps({"routeid": route_parent_id, "servicetypeid": 0}),
+    try:
+        result = fetch_cached(
+            f'SearchByRouteDetails_v4_{route_parent_id}', str(route_parent_id),
+            lambda: bmtc_api.post(
+                'SearchByRouteDetails_v4',
+                json.dumps({"routeid": route_parent_id, "servicetypeid": 0}),
                 timeout=60
-            )
-            result = resp.json()
-            store_cached_response(cache_desc, str(route_parent_id), result)
-        except Exception:
-            return []
+            ).json()
+        )
+    except Exception:
+        return []
 
     stop_ids_set = set(str(sid) for sid in stop_ids)
 
@@ -230,7 +95,8 @@ def main():
     stop_ids = sys.argv[1:]
     print(f'Stop IDs: {stop_ids}')
 
-    init_cache_db()
+    api_cache.init_cache_db()
+    api_cache.warm_cache(('SearchRoute_v2', 'SearchByRouteDetails_v4'))
 
     # Read existing CSV
     rows = []
@@ -318,6 +184,7 @@ def main():
     if failed:
         print(f'Failed ({len(failed)}): {", ".join(failed)}')
 
+    api_cache.close()
     print('Done')
 
 
@@ -1,228 +1,602 @@
+import concurrent.futures
 import csv
 import datetime
+import glob
+import gzip
 import json
+import math
+import mmap
 import os
+import queue
+import re
+import struct
 import sys
+import time
 import hashlib
-import sqlite3
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from array import array
 
-import requests
+import api_cache
+import bmtc_api
+from api_cache import fetch_cached
+from fetch_engine import FetchEngine
+from route_search import fetch_route_parent_ids
+from bmtc_api import REQUEST_HEADERS_EN, REQUEST_HEADERS_KN, VARNAM_API_URL
+
+try:
+    import brotli  # Optional: .br siblings in release mode
+except ImportError:
+    brotli = None
 
 # ──────────────────────────────────────────────
 # Configuration
 # ──────────────────────────────────────────────
 
 GTFS_FOLDER = '../assets/bmtc-vonter/'  # Path to GTFS folder (needs stop_times.txt and stops.txt)
+GTFS_SNAPSHOT_PATH = 'gtfs_snapshot.bin'  # Columnar snapshot of the feed, rebuilt when the feed changes
+KN_CURATED_CSV_PATH = 'input/bus-stops-kn.csv'             # Curated English -> Kannada stop names (read-only)
+KN_GENERATED_CSV_PATH = 'input/bus-stops-kn-generated.csv'  # Names composed / transliterated by earlier runs
 
-API_URL = 'https://bmtcmobileapi.karnataka.gov.in/WebAPI/'
-VARNAM_API_URL = 'https://api.varnamproject.com/tl/kn/{word}'
-
-REQUEST_HEADERS_EN = {
-    'Accept': 'application/json, text/plain, */*',
-    'Accept-Language': 'en-US,en;q=0.5',
-    'Content-Type': 'application/json',
-    'lan': 'en',
-    'deviceType': 'WEB',
-    'Origin': 'https://bmtcwebportal.amnex.com',
-    'Referer': 'https://bmtcwebportal.amnex.com/',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-}
-
-REQUEST_HEADERS_KN = {
-    **REQUEST_HEADERS_EN,
-    'lan': 'kn',
-}
-
-CACHE_DB_PATH = 'api_cache.db'
-CACHE_DURATION_HOURS = 24
 MAX_WORKERS = 10
+FETCH_MODE = 'threads'  # 'threads' (fixed MAX_WORKERS pool) or 'async' (adaptive concurrency, also --async)
 VARNAM_CONCURRENCY = 4
+KN_TOKEN_MIN_AGREEMENT = 0.5  # Share of aligned occurrences a learned Kannada token must win
+KN_TOKEN_MIN_OCCURRENCES = 2  # ... and how many aligned occurrences it needs to be learned at all
+MISSING_ROUTES_CONCURRENCY = MAX_WORKERS  # In-flight GetTimetableByRouteid_v3 requests (step 3b)
+MISSING_ROUTES_DEADLINE_SECONDS = 300     # Step 3b keeps whatever arrived by then
+
+NORMALIZED_OUTPUT = False  # Shared stop table + per-route stop indices in the output GeoJSON (also --normalized)
+SHARDED_OUTPUT = False     # Light platform index + one stops shard per platform (also --sharded)
+RELEASE_OUTPUT = False     # Minified, content-hashed outputs with .gz/.br siblings and a manifest (also --release)
+ENCODED_COORDINATES = False  # Polyline-encoded stop coordinates in the outputs (also --encoded-coords)
+COORDINATE_PRECISION = 5     # Decimal places kept by --encoded-coords (GTFS stops.txt uses 5, ~1 m)
+STOP_GRID_CELL_DEGREES = 0.01  # Cell size of the stops-grid.json spatial index (~1.1 km)
+DATA_MANIFEST_PATH = 'static/data/manifest.json'  # Logical output name -> published (hashed) file name
+CONTENT_HASH_LENGTH = 10
+
+# Cache desc prefixes bulk-loaded into memory at startup (see api_cache.warm_cache)
+CACHE_WARM_ENDPOINTS = (
+    'GetAllRouteList', 'timetable', 'GetTimetableByRouteid_v3',
+    'SearchRoute_v2', 'SearchByRouteDetails_v4', 'varnam',
+)
 
 # ──────────────────────────────────────────────
-# SQLite API Cache
+# GTFS: Binary snapshot of stop_times / stops
 # ──────────────────────────────────────────────
 
-def init_cache_db():
-    conn = sqlite3.connect(CACHE_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS api_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            request_hash TEXT UNIQUE NOT NULL,
-            request_desc TEXT NOT NULL,
-            response_data TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+GTFS_SNAPSHOT_MAGIC = b'BMTCGTFS'
+GTFS_SNAPSHOT_VERSION = 5
+GTFS_FEED_FILES = ('stop_times.txt', 'stops.txt')
+
+# Column name -> array typecode. Stops and trips are interned to int32 indices;
+# *_offsets columns are CSR offsets into the column that follows them.
+GTFS_SNAPSHOT_COLUMNS = {
+    'stop_id_offsets': 'i',
+    'stop_id_blob': 'B',
+    'stop_name_offsets': 'i',
+    'stop_name_blob': 'B',
+    'stop_lat': 'd',
+    'stop_lon': 'd',
+    'trip_offsets': 'i',      # trip -> range in trip_stops
+    'trip_stops': 'i',        # stop indices in stop_sequence order
+    'occ_offsets': 'i',       # stop -> range in occ_trip / occ_pos
+    'occ_trip': 'i',          # trips serving the stop, in trip order
+    'occ_pos': 'i',           # first position of the stop within that trip
+    'succ_offsets': 'i',      # stop graph (CSR): stop -> range in succ
+    'succ': 'i',              # distinct next stops over all trips
+    'pred_offsets': 'i',      # reverse stop graph: stop -> range in pred
+    'pred': 'i',              # distinct previous stops over all trips
+}
+
+
+def gtfs_feed_stat(gtfs_folder):
+    """Cheap (size, mtime) signature of the feed files used to skip rehashing."""
+    stat = {}
+    for name in GTFS_FEED_FILES:
+        path = os.path.join(gtfs_folder, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            stat[name] = [st.st_size, st.st_mtime_ns]
+    return stat
 
 
-def get_cache_key(desc, request_data):
-    request_string = f"{desc}:{request_data}"
-    return hashlib.md5(request_string.encode()).hexdigest()
+def hash_gtfs_feed(gtfs_folder):
+    """MD5 over the contents of the feed files."""
+    h = hashlib.md5()
+    for name in GTFS_FEED_FILES:
+        path = os.path.join(gtfs_folder, name)
+        if not os.path.exists(path):
+            continue
+        h.update(name.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _pack_strings(strings):
+    offsets = array('i', [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, array('B', blob)
+
+
+def _build_csr(node_count, edges):
+    """Build CSR (offsets, targets) from (source, target) pairs, targets sorted per source."""
+    buckets = [[] for _ in range(node_count)]
+    for u, v in edges:
+        buckets[u].append(v)
+    offsets = array('i', [0])
+    targets = array('i')
+    for bucket in buckets:
+        bucket.sort()
+        targets.extend(bucket)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def build_gtfs_snapshot(gtfs_folder):
+    """Parse stop_times.txt / stops.txt into interned, array-backed columns.
+
+    Besides the per-trip stop sequences this derives each stop's occurrences (one
+    per trip serving it, at its first position in that trip) and the directed
+    stop graph: an edge u -> v
+    exists when some trip serves v directly after u.
+    """
+    stop_lookup = {}
+    stop_id_list = []
+
+    def intern_stop(stop_id):
+        idx = stop_lookup.get(stop_id)
+        if idx is None:
+            idx = stop_lookup[stop_id] = len(stop_id_list)
+            stop_id_list.append(stop_id)
+        return idx
+
+    names = {}
+    coords = {}
+    stops_txt_path = os.path.join(gtfs_folder, 'stops.txt')
+    if os.path.exists(stops_txt_path):
+        with open(stops_txt_path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                idx = intern_stop(row['stop_id'])
+                names[idx] = row['stop_name']
+                coords[idx] = (float(row['stop_lat']), float(row['stop_lon']))
+
+    trips = {}
+    with open(os.path.join(gtfs_folder, 'stop_times.txt'), mode='r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        trip_col = header.index('trip_id')
+        stop_col = header.index('stop_id')
+        seq_col = header.index('stop_sequence')
+        for row in reader:
+            trips.setdefault(row[trip_col], []).append((int(row[seq_col]), intern_stop(row[stop_col])))
+
+    trip_offsets = array('i', [0])
+    trip_stops = array('i')
+    occurrences = [[] for _ in stop_id_list]
+    edges = set()
+    for trip_idx, rows in enumerate(trips.values()):
+        rows.sort(key=lambda x: x[0])
+        seen = set()
+        prev = None
+        for pos, (_, stop_idx) in enumerate(rows):
+            trip_stops.append(stop_idx)
+            if stop_idx not in seen:
+                seen.add(stop_idx)
+                occurrences[stop_idx].append((trip_idx, pos))
+            if prev is not None and prev != stop_idx:
+                edges.add((prev, stop_idx))
+            prev = stop_idx
+        trip_offsets.append(len(trip_stops))
+
+    occ_offsets = array('i', [0])
+    occ_trip = array('i')
+    occ_pos = array('i')
+    for occ in occurrences:
+        for trip_idx, pos in occ:
+            occ_trip.append(trip_idx)
+            occ_pos.append(pos)
+        occ_offsets.append(len(occ_trip))
+
+    succ_offsets, succ = _build_csr(len(stop_id_list), edges)
+    pred_offsets, pred = _build_csr(len(stop_id_list), ((v, u) for u, v in edges))
+
+    nan = float('nan')
+    stop_id_offsets, stop_id_blob = _pack_strings(stop_id_list)
+    stop_name_offsets, stop_name_blob = _pack_strings(names.get(i, '') for i in range(len(stop_id_list)))
+    return {
+        'stop_id_offsets': stop_id_offsets,
+        'stop_id_blob': stop_id_blob,
+        'stop_name_offsets': stop_name_offsets,
+        'stop_name_blob': stop_name_blob,
+        'stop_lat': array('d', (coords.get(i, (nan, nan))[0] for i in range(len(stop_id_list)))),
+        'stop_lon': array('d', (coords.get(i, (nan, nan))[1] for i in range(len(stop_id_list)))),
+        'trip_offsets': trip_offsets,
+        'trip_stops': trip_stops,
+        'occ_offsets': occ_offsets,
+        'occ_trip': occ_trip,
+        'occ_pos': occ_pos,
+        'succ_offsets': succ_offsets,
+        'succ': succ,
+        'pred_offsets': pred_offsets,
+        'pred': pred,
+    }
 
 
-def get_cached_response(desc, request_data):
+def write_gtfs_snapshot(path, columns, feed_stat, feed_hash):
+    """Write columns as 8-byte aligned raw arrays behind a small JSON header."""
+    layout = {}
+    offset = 0
+    for name in GTFS_SNAPSHOT_COLUMNS:
+        col = columns[name]
+        layout[name] = [offset, len(col)]
+        offset += -(-len(col) * col.itemsize // 8) * 8
+
+    header = json.dumps({
+        'version': GTFS_SNAPSHOT_VERSION,
+        'feed_stat': feed_stat,
+        'feed_hash': feed_hash,
+        'columns': layout,
+    }).encode()
+    header += b' ' * (-(len(GTFS_SNAPSHOT_MAGIC) + 4 + len(header)) % 8)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(GTFS_SNAPSHOT_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for name in GTFS_SNAPSHOT_COLUMNS:
+            data = columns[name].tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, path)
+
+
+def read_gtfs_snapshot(path):
+    """Memory-map a snapshot file. Returns (header, columns) or None if unreadable."""
     try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cursor = conn.cursor()
-        cache_key = get_cache_key(desc, request_data)
-        cursor.execute(
-            f"SELECT response_data FROM api_cache WHERE request_hash = ? AND created_at > datetime('now', '-{CACHE_DURATION_HOURS} hours')",
-            (cache_key,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            return json.loads(result[0])
-        return None
-    except Exception as e:
-        print(f'  cache error: {e}')
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
         return None
 
-
-def store_cached_response(desc, request_data, response_data):
+    # A truncated or corrupt snapshot is just a cache miss
     try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cursor = conn.cursor()
-        cache_key = get_cache_key(desc, request_data)
-        cursor.execute(
-            'INSERT OR REPLACE INTO api_cache (request_hash, request_desc, response_data, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)',
-            (cache_key, desc, json.dumps(response_data))
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f'  cache store error: {e}')
+        prefix = len(GTFS_SNAPSHOT_MAGIC)
+        if buf[:prefix] != GTFS_SNAPSHOT_MAGIC:
+            return None
+        (header_len,) = struct.unpack_from('<I', buf, prefix)
+        data_start = prefix + 4 + header_len
+        header = json.loads(buf[prefix + 4:data_start])
+        if header.get('version') != GTFS_SNAPSHOT_VERSION or not {'feed_stat', 'feed_hash', 'columns'} <= header.keys():
+            return None
 
+        view = memoryview(buf)
+        columns = {}
+        for name, typecode in GTFS_SNAPSHOT_COLUMNS.items():
+            offset, count = header['columns'][name]
+            size = array(typecode).itemsize
+            start = data_start + offset
+            if start + count * size > len(buf):
+                return None
+            columns[name] = view[start:start + count * size].cast(typecode)
+    except (struct.error, KeyError, TypeError, ValueError, AttributeError):
+        return None
+    return header, columns
 
-def cleanup_expired_cache():
-    try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f"DELETE FROM api_cache WHERE created_at <= datetime('now', '-{CACHE_DURATION_HOURS} hours')")
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
-        if deleted > 0:
-            print(f'Cleaned up {deleted} expired cache entries')
-    except Exception as e:
-        print(f'Cache cleanup error: {e}')
+
+def load_gtfs_snapshot(gtfs_folder=None, snapshot_path=None):
+    """Load the GTFS snapshot, rebuilding it when the feed files have changed.
+
+    The snapshot is reused while the feed's (size, mtime) matches; if only the
+    mtime changed, the content hash decides whether it is still valid, and a
+    still-valid snapshot is rewritten with the new (size, mtime) so later runs
+    skip the hash again.
+    """
+    gtfs_folder = gtfs_folder or GTFS_FOLDER
+    snapshot_path = snapshot_path or GTFS_SNAPSHOT_PATH
+    feed_stat = gtfs_feed_stat(gtfs_folder)
+
+    loaded = read_gtfs_snapshot(snapshot_path) if os.path.exists(snapshot_path) else None
+    if loaded is not None:
+        header, columns = loaded
+        if header['feed_stat'] != feed_stat:
+            feed_hash = hash_gtfs_feed(gtfs_folder)
+            if header['feed_hash'] != feed_hash:
+                loaded = None
+            else:
+                write_gtfs_snapshot(snapshot_path, columns, feed_stat, feed_hash)
+                loaded = read_gtfs_snapshot(snapshot_path)
+
+    if loaded is None:
+        print(f'Building GTFS snapshot from {gtfs_folder}...')
+        columns = build_gtfs_snapshot(gtfs_folder)
+        write_gtfs_snapshot(snapshot_path, columns, feed_stat, hash_gtfs_feed(gtfs_folder))
+        header, columns = read_gtfs_snapshot(snapshot_path)
+
+    offsets = columns['stop_id_offsets']
+    blob = columns['stop_id_blob']
+    stop_ids = [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(len(offsets) - 1)]
+
+    snapshot = dict(columns)
+    snapshot['stop_ids'] = stop_ids
+    snapshot['stop_lookup'] = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+    print(f'  GTFS snapshot: {len(stop_ids)} stops, {len(columns["trip_offsets"]) - 1} trips, '
+          f'{len(columns["trip_stops"])} stop times, {len(columns["succ"])} stop graph edges')
+    return snapshot
+
+
+def snapshot_stop_info(snapshot, stop_id):
+    """Return {name, lat, lon} for a stop_id from the snapshot, or None if not in stops.txt."""
+    idx = snapshot['stop_lookup'].get(stop_id)
+    if idx is None:
+        return None
+    lat = snapshot['stop_lat'][idx]
+    if lat != lat:  # NaN: stop only referenced by stop_times.txt
+        return None
+    offsets = snapshot['stop_name_offsets']
+    name = bytes(snapshot['stop_name_blob'][offsets[idx]:offsets[idx + 1]]).decode('utf-8')
+    return {'name': name, 'lat': lat, 'lon': snapshot['stop_lon'][idx]}
 
 
 # ──────────────────────────────────────────────
-# GTFS: Discover neighboring stops
+# GTFS: Stop graph reachability
 # ──────────────────────────────────────────────
 
-def get_next_stops(stop_ids, nest_level=2):
-    """Find stops reachable from stop_ids within nest_level hops using GTFS data."""
+def _stop_graph(snapshot, direction):
+    if direction == 'down':
+        return snapshot['succ_offsets'], snapshot['succ']
+    if direction == 'up':
+        return snapshot['pred_offsets'], snapshot['pred']
+    raise ValueError(f'Unknown stop graph direction: {direction}')
+
+
+def stop_graph_levels(snapshot, stop_ids, max_hops, direction='down', graph=None):
+    """Breadth-first search over the snapshot's stop graph.
+
+    Returns a list of stop_id lists where levels[k] holds the stops first reached
+    after k hops (levels[0] are the known stop_ids themselves), in BFS order.
+    direction='down' follows trips forward (next stops), 'up' follows them
+    backward (previous stops). graph overrides the snapshot's graph with another
+    (offsets, targets) CSR pair over the same stop indices.
+    """
+    offsets, targets = graph or _stop_graph(snapshot, direction)
+    stop_lookup = snapshot['stop_lookup']
+    snapshot_stop_ids = snapshot['stop_ids']
+    visited = bytearray(len(snapshot_stop_ids))
+
+    frontier = []
+    for stop_id in stop_ids:
+        idx = stop_lookup.get(stop_id)
+        if idx is not None and not visited[idx]:
+            visited[idx] = 1
+            frontier.append(idx)
+
+    levels = [[snapshot_stop_ids[idx] for idx in frontier]]
+    for _ in range(max_hops):
+        next_frontier = []
+        for idx in frontier:
+            for target in targets[offsets[idx]:offsets[idx + 1]]:
+                if not visited[target]:
+                    visited[target] = 1
+                    next_frontier.append(target)
+        if not next_frontier:
+            break
+        levels.append([snapshot_stop_ids[idx] for idx in next_frontier])
+        frontier = next_frontier
+
+    return levels
+
+
+def stop_graph_neighbors(snapshot, stop_id, direction='down', graph=None):
+    """Direct successors ('down') or predecessors ('up') of a stop in the stop graph."""
+    idx = snapshot['stop_lookup'].get(stop_id)
+    if idx is None:
+        return []
+    offsets, targets = graph or _stop_graph(snapshot, direction)
+    snapshot_stop_ids = snapshot['stop_ids']
+    return [snapshot_stop_ids[t] for t in targets[offsets[idx]:offsets[idx + 1]]]
+
+
+def station_stop_graph(snapshot, stop_ids, nest_level):
+    """The part of the stop graph walked by trips through a station, as CSR (offsets, targets).
+
+    For every trip serving one of stop_ids, the nest_level edges that follow the
+    stop on that trip are kept. Each stop's targets are in first-seen order
+    (station stops in order, trips in feed order), not sorted.
+    """
+    stop_lookup = snapshot['stop_lookup']
+    trip_offsets, trip_stops = snapshot['trip_offsets'], snapshot['trip_stops']
+    occ_offsets, occ_trip, occ_pos = snapshot['occ_offsets'], snapshot['occ_trip'], snapshot['occ_pos']
+
+    buckets = {}  # stop -> targets in first-seen order
+    seen_edges = set()
+    for stop_id in stop_ids:
+        idx = stop_lookup.get(stop_id)
+        if idx is None:
+            continue
+        for occ in range(occ_offsets[idx], occ_offsets[idx + 1]):
+            trip = occ_trip[occ]
+            start = trip_offsets[trip] + occ_pos[occ]
+            sequence = trip_stops[start:min(start + nest_level + 1, trip_offsets[trip + 1])]
+            for curr, nxt in zip(sequence, sequence[1:]):
+                if (curr, nxt) not in seen_edges:
+                    seen_edges.add((curr, nxt))
+                    buckets.setdefault(curr, []).append(nxt)
+
+    offsets = array('i', [0])
+    targets = array('i')
+    for idx in range(len(snapshot['stop_ids'])):
+        targets.extend(buckets.get(idx, ()))
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def get_next_stops(stop_ids, nest_level=2, snapshot=None):
+    """Find stops reachable from stop_ids within nest_level hops using GTFS data.
+
+    Walks station_stop_graph() up to nest_level - 1 hops out from stop_ids and
+    returns {stop_id: [next stop_ids]} for every stop reached. Only trips through
+    the station contribute: the full stop graph would also follow other trips at
+    intermediate stops and query far more stop pairs than the station's routes use.
+    """
     print(f'Loading GTFS stop_times for neighbor discovery (nest_level={nest_level})...')
 
-    with open(f"{GTFS_FOLDER}stop_times.txt", mode='r') as file:
-        reader = csv.DictReader(file)
-        stop_times = list(reader)
+    if snapshot is None:
+        snapshot = load_gtfs_snapshot()
+
+    graph = station_stop_graph(snapshot, stop_ids, nest_level)
+    levels = stop_graph_levels(snapshot, stop_ids, max(nest_level - 1, 0), graph=graph)
 
     next_stops_total = {stop_id: [] for stop_id in stop_ids}
+    for level in levels:
+        for stop_id in level:
+            neighbors = stop_graph_neighbors(snapshot, stop_id, graph=graph)
+            if neighbors:
+                next_stops_total[stop_id] = neighbors
 
-    # Group by trip_id
-    stop_times_by_trip = {}
-    for st in stop_times:
-        stop_times_by_trip.setdefault(st['trip_id'], []).append(st)
+    print(f'Found neighbors for {len(next_stops_total)} stops')
+    return next_stops_total
 
-    for trip_id in stop_times_by_trip:
-        stop_times_by_trip[trip_id].sort(key=lambda x: int(x['stop_sequence']))
 
-    for stop_id in stop_ids:
-        for st in stop_times:
-            if st['stop_id'] != stop_id:
-                continue
+# ──────────────────────────────────────────────
+# Received routes store
+# ──────────────────────────────────────────────
 
-            trip_id = st['trip_id']
-            trip_stop_times = stop_times_by_trip[trip_id]
+class ScheduleStore:
+    """Routes received from the timetable queries, indexed for the later stages.
 
-            current_index = next(
-                (i for i, x in enumerate(trip_stop_times) if x['stop_id'] == stop_id), None
-            )
-            if current_index is None:
-                continue
+    Entries are keyed by route ID (in arrival order) with secondary indexes on
+    route number, parent ID and from-station ID. Index keys are stored as strings.
 
-            for offset in range(nest_level):
-                idx = current_index + offset
-                if idx >= len(trip_stop_times) - 1:
-                    break
+    The store is single-writer and not locked: upsert() and set_parent_id() update
+    the entry and its indexes in several steps, so all writes happen on the thread
+    that merges fetch results (fetch workers only return responses).
+    """
 
-                curr = trip_stop_times[idx]['stop_id']
-                nxt = trip_stop_times[idx + 1]['stop_id']
+    INDEXED_FIELDS = ('route-number', 'route-parent-id', 'from-station-id')
 
-                if curr not in next_stops_total:
-                    next_stops_total[curr] = []
-                if nxt not in next_stops_total[curr]:
-                    next_stops_total[curr].append(nxt)
+    def __init__(self):
+        self._routes = {}  # route_id -> entry
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}  # field -> key -> {route_id: None}
+        self.failed = []
 
-    print(f'Found neighbors for {len(next_stops_total)} stops')
-    return next_stops_total
+    def _index(self, field, entry, route_id):
+        value = entry.get(field)
+        if value not in (None, ''):
+            self._indexes[field].setdefault(str(value), {})[route_id] = None
+
+    def _unindex(self, field, entry, route_id):
+        value = entry.get(field)
+        if value not in (None, ''):
+            self._indexes[field].get(str(value), {}).pop(route_id, None)
+
+    def upsert(self, entry):
+        """Add a route entry, replacing (in place) any earlier entry for the same route ID."""
+        route_id = entry['route-id']
+        previous = self._routes.get(route_id)
+        self._routes[route_id] = entry
+        for field in self.INDEXED_FIELDS:
+            if previous is not None and previous.get(field) != entry.get(field):
+                self._unindex(field, previous, route_id)
+            self._index(field, entry, route_id)
+
+    def add_failure(self, failure):
+        self.failed.append(failure)
+
+    def set_parent_id(self, route_id, parent_id):
+        entry = self._routes[route_id]
+        self._unindex('route-parent-id', entry, route_id)
+        entry['route-parent-id'] = parent_id
+        self._index('route-parent-id', entry, route_id)
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __iter__(self):
+        return iter(list(self._routes.values()))
+
+    def __contains__(self, route_id):
+        return route_id in self._routes
+
+    def get(self, route_id):
+        return self._routes.get(route_id)
+
+    def _lookup(self, field, value):
+        return [self._routes[route_id] for route_id in list(self._indexes[field].get(str(value), ()))]
+
+    def by_route_number(self, route_number):
+        return self._lookup('route-number', route_number)
+
+    def by_parent_id(self, parent_id):
+        return self._lookup('route-parent-id', parent_id)
+
+    def by_from_station(self, station_id):
+        return self._lookup('from-station-id', station_id)
+
+    def _values(self, field):
+        """Distinct values of an indexed field, as stored on the entries."""
+        return [
+            self._routes[next(iter(route_ids))][field]
+            for route_ids in list(self._indexes[field].values()) if route_ids
+        ]
+
+    def route_numbers(self):
+        return self._values('route-number')
+
+    def parent_ids(self):
+        return self._values('route-parent-id')
+
+    def to_dict(self):
+        """Raw-output form: {"Failed": [...], "Received": [...]}."""
+        return {"Failed": list(self.failed), "Received": list(self._routes.values())}
 
 
 # ──────────────────────────────────────────────
 # BMTC API: Fetch routes and platform data
 # ──────────────────────────────────────────────
 
-def fetch_all_routes():
+def fetch_route_list(lang, headers):
+    """Fetch the GetAllRouteList payload for one language ('en' or 'kn')."""
+    def fetch():
+        resp = bmtc_api.post('GetAllRouteList', '{}', headers=headers, timeout=60)
+        try:
+            return resp.json()
+        except Exception as e:
+            print(f'Error decoding {lang} route list JSON: {e}')
+            return {}
+
+    return fetch_cached(f'GetAllRouteList_{lang}', '{}', fetch)
+
+
+def fetch_all_routes(engine):
     """Fetch all routes from BMTC API in both English and Kannada."""
     print('Fetching all routes from API...')
 
-    # English
-    cached = get_cached_response('GetAllRouteList_en', '{}')
-    if cached:
-        routes_en_data = cached
-    else:
-        resp = requests.post(f'{API_URL}GetAllRouteList', headers=REQUEST_HEADERS_EN, data='{}')
-        try:
-            routes_en_data = resp.json()
-        except Exception as e:
-            print(f'Error decoding route list JSON: {e}')
-            routes_en_data = {}
-        store_cached_response('GetAllRouteList_en', '{}', routes_en_data)
+    en_future = engine.submit(fetch_route_list, 'en', REQUEST_HEADERS_EN)
+    kn_future = engine.submit(fetch_route_list, 'kn', REQUEST_HEADERS_KN)
 
-    routes_en = {route['routeid']: route for route in routes_en_data.get('data', [])}
+    routes_en = {route['routeid']: route for route in en_future.result().get('data', [])}
     print(f'  Loaded {len(routes_en)} routes (English)')
 
-    # Kannada
-    cached = get_cached_response('GetAllRouteList_kn', '{}')
-    if cached:
-        routes_kn_data = cached
-    else:
-        resp = requests.post(f'{API_URL}GetAllRouteList', headers=REQUEST_HEADERS_KN, data='{}')
-        try:
-            routes_kn_data = resp.json()
-        except Exception as e:
-            print(f'Error decoding Kannada route list JSON: {e}')
-            routes_kn_data = {}
-        store_cached_response('GetAllRouteList_kn', '{}', routes_kn_data)
-
-    routes_kn = {route['routeid']: route for route in routes_kn_data.get('data', [])}
+    routes_kn = {route['routeid']: route for route in kn_future.result().get('data', [])}
     print(f'  Loaded {len(routes_kn)} routes (Kannada)')
 
     return routes_en, routes_kn
 
 
-def fetch_platform_assignments(stop_ids, next_stops, overrides, nest_level=2):
+def fetch_platform_assignments(stop_ids, next_stops, overrides, engine, nest_level=2):
     """Query BMTC API for platform assignments using neighboring stop pairs."""
     print('Fetching platform assignments from API...')
 
     tomorrow_start = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime('%Y-%m-%d 00:00')
     tomorrow_end = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime('%Y-%m-%d 23:59')
 
-    schedule_times = {"Failed": [], "Received": []}
+    schedule = ScheduleStore()
     routes_done = set()
-    routes_done_lock = threading.Lock()
-    received_lock = threading.Lock()
-    failed_lock = threading.Lock()
-
-    s = {level: set() for level in range(nest_level + 1)}
 
     def send_request(from_stop, to_stop):
         data = json.dumps({
@@ -235,30 +609,17 @@ def fetch_platform_assignments(stop_ids, next_stops, overrides, nest_level=2):
             "p_date": tomorrow_start
         })
 
-        # Check cache
-        cache_desc = f'timetable_{from_stop}_{to_stop}'
-        cached = get_cached_response(cache_desc, data)
-        if cached is not None:
-            is_failed = (
-                cached.get("exception") not in (None, False) or
-                cached.get("isException") is True or
-                cached.get("Issuccess") is not True
-            )
-            return from_stop, to_stop, cached, is_failed
-
-        try:
-            response = requests.post(
-                f'{API_URL}GetTimetableByStation_v4',
-                headers=REQUEST_HEADERS_EN, data=data
-            ).json()
-        except Exception:
-            response = {
-                "isException": True, "Issuccess": False,
-                "exception": "Response not received in JSON.",
-                "Message": "Response not received in JSON."
-            }
+        def fetch():
+            try:
+                return bmtc_api.post('GetTimetableByStation_v4', data).json()
+            except Exception:
+                return {
+                    "isException": True, "Issuccess": False,
+                    "exception": "Response not received in JSON.",
+                    "Message": "Response not received in JSON."
+                }
 
-        store_cached_response(cache_desc, data, response)
+        response = fetch_cached(f'timetable_{from_stop}_{to_stop}', data, fetch)
 
         is_failed = (
             response.get("exception") not in (None, False) or
@@ -267,176 +628,246 @@ def fetch_platform_assignments(stop_ids, next_stops, overrides, nest_level=2):
         )
         return from_stop, to_stop, response, is_failed
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    # Work queue: every station stop is seeded at once and each failed (from, to) pair
+    # immediately queues its next-hop pairs, so no chain waits on another's level.
+    # Responses are only buffered here; they are merged afterwards in a fixed order.
+    completed = queue.Queue()
+    responses = {}  # (from_stop, to_stop) -> (response, is_failed)
+    requested = set()
+    outstanding = 0
+
+    def enqueue(from_stop, to_stop, level):
+        nonlocal outstanding
+        if (from_stop, to_stop) in requested:
+            return
+        requested.add((from_stop, to_stop))
+        future = engine.submit(send_request, from_stop, to_stop)
+        future.add_done_callback(lambda f: completed.put((f, level)))
+        outstanding += 1
+
+    for stop in stop_ids:
+        for n in next_stops.get(stop, []):
+            enqueue(stop, n, 0)
+    print(f'  Seeded {outstanding} requests from {len(stop_ids)} station stops')
+
+    while outstanding:
+        future, level = completed.get()
+        outstanding -= 1
+        from_stop, to_stop, response, is_failed = future.result()
+        responses[(from_stop, to_stop)] = (response, is_failed)
+        if is_failed and level + 1 < nest_level:
+            for n in next_stops.get(to_stop, []):
+                enqueue(from_stop, n, level + 1)
+
+    def merge_order():
+        """Replay the chains station stop by station stop, level by level.
+
+        Returns ([(pair, level)] in merge order, pairs the order needs that were
+        never fetched). The second list is non-empty only when the work queue
+        reached a pair first through a longer chain and so didn't expand it.
+        """
+        order, missing, seen = [], [], set()
         for stop in stop_ids:
-            print(f'  Processing stop {stop}')
-            s[0].add(stop)
-
+            frontier = [(stop, n) for n in next_stops.get(stop, [])]
             for level in range(nest_level):
-                has_failures = False
-                futures = []
-                print(f'    Level {level}: querying {len(s[level])} stops')
-
-                for b in s[level]:
-                    if b not in next_stops:
+                next_frontier = []
+                for pair in frontier:
+                    if pair in seen:
                         continue
-                    for n in next_stops[b]:
-                        futures.append(executor.submit(send_request, stop, n))
-
-                for future in as_completed(futures):
-                    from_stop, to_stop, response, is_failed = future.result()
-
-                    if is_failed:
-                        with failed_lock:
-                            schedule_times["Failed"].append({
-                                "from_stop": from_stop,
-                                "to_stop": to_stop,
-                                "response": response,
-                                "level": level
-                            })
-                        s[level + 1].add(to_stop)
-                        has_failures = True
-                    else:
-                        for route_entry in response.get("data", []):
-                            route_id = route_entry["routeid"]
-                            pf_name = overrides.get(str(route_id), route_entry.get("platformname", ""))
-                            pf_num = overrides.get(str(route_id), route_entry.get("platformnumber", ""))
-
-                            with routes_done_lock:
-                                if route_id in routes_done:
-                                    continue
-                                if (pf_name and pf_name != "") or (pf_num and pf_num != ""):
-                                    routes_done.add(route_id)
-
-                            with received_lock:
-                                new_entry = {
-                                    "route-number": route_entry.get('routeno', ''),
-                                    "route-name": route_entry.get("routename", ""),
-                                    "from-station-id": route_entry.get('fromstationid', ''),
-                                    "route-id": route_id,
-                                    "route-parent-id": '',  # populated later by fetch_all_route_stops
-                                    "platform-name": pf_name,
-                                    "platform-number": pf_num,
-                                    "bay-number": route_entry.get("baynumber"),
-                                }
-
-                                # Update if exists, otherwise add
-                                existing_index = None
-                                for i, existing in enumerate(schedule_times["Received"]):
-                                    if existing.get("route-id") == route_id:
-                                        existing_index = i
-                                        break
-                                if existing_index is not None:
-                                    schedule_times["Received"][existing_index] = new_entry
-                                else:
-                                    schedule_times["Received"].append(new_entry)
-
-                if not has_failures:
-                    print(f'    All requests successful at level {level}, stopping')
-                    break
-
-    print(f'  Received {len(schedule_times["Received"])} routes, {len(schedule_times["Failed"])} failures')
-    return schedule_times
+                    seen.add(pair)
+                    if pair not in responses:
+                        missing.append(pair)
+                        continue
+                    order.append((pair, level))
+                    if responses[pair][1]:
+                        next_frontier.extend((stop, n) for n in next_stops.get(pair[1], []))
+                frontier = next_frontier
+        return order, missing
+
+    order, missing = merge_order()
+    while missing:
+        requested.update(missing)
+        futures = [engine.submit(send_request, *pair) for pair in missing]
+        for future in futures:
+            from_stop, to_stop, response, is_failed = future.result()
+            responses[(from_stop, to_stop)] = (response, is_failed)
+        order, missing = merge_order()
+
+    # Merge in chain order so routes_done and the store's order (which smart
+    # platform matching relies on) never depend on response timing
+    for (from_stop, to_stop), level in order:
+        response, is_failed = responses[(from_stop, to_stop)]
+        if is_failed:
+            schedule.add_failure({
+                "from_stop": from_stop,
+                "to_stop": to_stop,
+                "response": response,
+                "level": level
+            })
+            continue
+
+        for route_entry in response.get("data", []):
+            route_id = route_entry["routeid"]
+            pf_name = overrides.get(str(route_id), route_entry.get("platformname", ""))
+            pf_num = overrides.get(str(route_id), route_entry.get("platformnumber", ""))
+
+            if route_id in routes_done:
+                continue
+            if (pf_name and pf_name != "") or (pf_num and pf_num != ""):
+                routes_done.add(route_id)
+
+            new_entry = {
+                "route-number": route_entry.get('routeno', ''),
+                "route-name": route_entry.get("routename", ""),
+                "from-station-id": route_entry.get('fromstationid', ''),
+                "route-id": route_id,
+                "route-parent-id": '',  # populated later by fetch_all_route_stops
+                "platform-name": pf_name,
+                "platform-number": pf_num,
+                "bay-number": route_entry.get("baynumber"),
+            }
+            schedule.upsert(new_entry)
+
+    print(f'  Sent {len(requested)} timetable requests')
+    print(f'  Received {len(schedule)} routes, {len(schedule.failed)} failures')
+    return schedule
 
 
 # ──────────────────────────────────────────────
 # BMTC API: Fetch individual missing routes by ID
 # ──────────────────────────────────────────────
 
-def fetch_missing_routes_by_id(missing_route_ids, routes_en, overrides):
+def fetch_missing_routes_by_id(missing_route_ids, routes_en, overrides, engine,
+                               deadline_seconds=MISSING_ROUTES_DEADLINE_SECONDS):
     """Query GetTimetableByRouteid_v3 for routes missing from bulk platform queries.
 
     A route is considered missing if its fromstationid matches one of our stop IDs
     but it was not returned by the GetTimetableByStation_v4 bulk queries.
+
+    At most MISSING_ROUTES_CONCURRENCY requests are in flight at once. When
+    deadline_seconds runs out, the routes received so far are returned; requests
+    already running are bounded by the same deadline (their timeouts and retries
+    never extend past it), and every route not completed by then, running or
+    never submitted, is reported as skipped.
     """
-    print(f'Fetching {len(missing_route_ids)} missing routes individually by route ID...')
+    total = len(missing_route_ids)
+    print(f'Fetching {total} missing routes individually by route ID...')
 
     today = datetime.datetime.now().strftime('%Y-%m-%d')
     start_time = f'{today} 00:01'
     end_time = f'{today} 23:59'
 
-    received = []
+    deadline = time.monotonic() + deadline_seconds
 
-    for route_id in missing_route_ids:
+    def fetch_route(route_id):
         data = json.dumps({
             "routeid": route_id,
             "starttime": start_time,
             "endtime": end_time,
             "current_date": today
         })
+        return fetch_cached(
+            f'GetTimetableByRouteid_v3_{route_id}', data,
+            lambda: bmtc_api.post('GetTimetableByRouteid_v3', data, timeout=30, deadline=deadline).json()
+        )
+
+    received = {}  # route_id -> entry
+    pending = {}   # future -> route_id
+    completed = set()
+    remaining = iter(missing_route_ids)
+
+    def submit_next():
+        if time.monotonic() >= deadline:
+            return
+        route_id = next(remaining, None)
+        if route_id is not None:
+            pending[engine.submit(fetch_route, route_id)] = route_id
+
+    for _ in range(MISSING_ROUTES_CONCURRENCY):
+        submit_next()
+
+    while pending:
+        finished, _ = concurrent.futures.wait(
+            pending, timeout=max(0, deadline - time.monotonic()),
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        if not finished:
+            for future in pending:
+                future.cancel()
+            break
+
+        for future in finished:
+            route_id = pending.pop(future)
+            submit_next()
+            completed.add(route_id)
+            progress = f'[{len(completed)}/{total}]'
 
-        cache_desc = f'GetTimetableByRouteid_v3_{route_id}'
-        cached = get_cached_response(cache_desc, data)
-        if cached is not None:
-            response = cached
-        else:
             try:
-                response = requests.post(
-                    f'{API_URL}GetTimetableByRouteid_v3',
-                    headers=REQUEST_HEADERS_EN,
-                    data=data,
-                    timeout=30
-                ).json()
-                store_cached_response(cache_desc, data, response)
+                response = future.result()
             except Exception as e:
-                print(f'  Error fetching route {route_id}: {e}')
+                print(f'  {progress} Error fetching route {route_id}: {e}')
                 continue
 
-        if response.get('Issuccess') is not True or not response.get('data'):
-            print(f'  Route {route_id}: no data returned')
-            continue
+            if response.get('Issuccess') is not True or not response.get('data'):
+                print(f'  {progress} Route {route_id}: no data returned')
+                continue
 
-        route_entry = response['data'][0]
-        route_en = routes_en.get(route_id, {})
+            route_entry = response['data'][0]
+            route_en = routes_en.get(route_id, {})
 
-        pf_name = overrides.get(str(route_id), route_entry.get('platformname', ''))
-        pf_num = overrides.get(str(route_id), route_entry.get('platformnumber', ''))
-
-        new_entry = {
-            'route-number': route_en.get('routeno', route_entry.get('routeno', '')),
-            'route-name': route_en.get('routename', route_entry.get('routename', '')),
-            'from-station-id': route_en.get('fromstationid', ''),
-            'route-id': route_id,
-            'route-parent-id': '',
-            'platform-name': pf_name,
-            'platform-number': pf_num,
-            'bay-number': route_entry.get('baynumber'),
-        }
-        received.append(new_entry)
-        print(f'  Fetched route {new_entry["route-number"]} (ID: {route_id}), platform: {pf_name or pf_num or "(none)"}')
+            pf_name = overrides.get(str(route_id), route_entry.get('platformname', ''))
+            pf_num = overrides.get(str(route_id), route_entry.get('platformnumber', ''))
+
+            new_entry = {
+                'route-number': route_en.get('routeno', route_entry.get('routeno', '')),
+                'route-name': route_en.get('routename', route_entry.get('routename', '')),
+                'from-station-id': route_en.get('fromstationid', ''),
+                'route-id': route_id,
+                'route-parent-id': '',
+                'platform-name': pf_name,
+                'platform-number': pf_num,
+                'bay-number': route_entry.get('baynumber'),
+            }
+            received[route_id] = new_entry
+            print(f'  {progress} Fetched route {new_entry["route-number"]} (ID: {route_id}), platform: {pf_name or pf_num or "(none)"}')
 
-    print(f'  Retrieved {len(received)}/{len(missing_route_ids)} missing routes')
-    return received
+    # Only the deadline leaves routes uncompleted: in flight when it passed, or never submitted
+    skipped = [route_id for route_id in missing_route_ids if route_id not in completed]
+    if skipped:
+        print(f'  Deadline of {deadline_seconds}s reached, skipped {len(skipped)} routes: '
+              f'{", ".join(str(route_id) for route_id in skipped)}')
+
+    print(f'  Retrieved {len(received)}/{total} missing routes')
+    return [received[route_id] for route_id in missing_route_ids if route_id in received]
 
 
 # ──────────────────────────────────────────────
-# Kannada translations via Varnam API
+# Kannada translations: learned token table, Varnam API fallback
 # ──────────────────────────────────────────────
 
+KN_ORDINAL_RE = re.compile(r'^(\d+)(?:st|nd|rd|th)$', re.IGNORECASE)  # "10th" -> "10ನೇ"
+KN_ORDINAL_SUFFIX = 'ನೇ'
+KN_ORDINAL_KEY = '{n}th'  # Token-table key of the learned ordinal template ("{n}ನೇ" or "{n} ನೇ")
+KN_TOKEN_PUNCTUATION = '.,;:()[]/\'"-'  # Stripped from token ends before learning / lookup
+
+
 def transliterate_varnam(word):
     """Transliterate a single word to Kannada using Varnam API."""
-    cache_desc = f'varnam_{word}'
-    cached = get_cached_response(cache_desc, word)
-    if cached is not None:
-        return cached.get('result', word)
+    def fetch():
+        resp = bmtc_api.get(VARNAM_API_URL.format(word=word.lower()), timeout=30)
+        if resp.status_code != 200:
+            raise ValueError(f'Varnam returned HTTP {resp.status_code}')
+        result = resp.json().get('result')
+        if isinstance(result, list) and result:
+            return {'result': result[0]}
+        if isinstance(result, str):
+            return {'result': result}
+        return {'result': word}
 
     try:
-        url = VARNAM_API_URL.format(word=word.lower())
-        resp = requests.get(url, timeout=30)
-        if resp.status_code == 200:
-            data = resp.json()
-            result = data.get('result')
-            if isinstance(result, list) and result:
-                kn = result[0]
-            elif isinstance(result, str):
-                kn = result
-            else:
-                kn = word
-            store_cached_response(cache_desc, word, {'result': kn})
-            return kn
+        return fetch_cached(f'varnam_{word}', word, fetch).get('result', word)
     except Exception:
-        pass
-    return word
+        return word
 
 
 def is_kannada(text):
@@ -449,200 +880,286 @@ def is_kannada(text):
     return False
 
 
-def get_kannada_route_info(routes_kn, route_id):
-    """Get Kannada route info from API data, transliterate if needed."""
+def get_kannada_route_info(routes_kn, route_id, kn_names):
+    """Get Kannada route info from API data, using resolved transliterations where needed."""
     route_kn = routes_kn.get(route_id, {})
     from_station = route_kn.get('fromstation', '')
     to_station = route_kn.get('tostation', '')
 
-    # If API returned English even with kn header, transliterate
+    # If API returned English even with kn header, use the transliteration
     if from_station and not is_kannada(from_station):
-        from_station = transliterate_varnam(from_station)
+        from_station = kn_names.get(from_station, from_station)
     if to_station and not is_kannada(to_station):
-        to_station = transliterate_varnam(to_station)
+        to_station = kn_names.get(to_station, to_station)
 
     return from_station, to_station
 
 
-def get_stop_name_kn(stop_name, kn_cache):
-    """Get Kannada stop name, using cache or Varnam API."""
-    if stop_name in kn_cache:
-        return kn_cache[stop_name]
-
-    kn = transliterate_varnam(stop_name)
-    kn_cache[stop_name] = kn
-    return kn
+def load_kannada_csv(path):
+    """Read a stop_name,stop_name_kn CSV into a dict (empty if missing or unreadable)."""
+    names = {}
+    if os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    names[row['stop_name']] = row['stop_name_kn']
+        except Exception as e:
+            print(f'WARNING: Could not load {path}: {e}')
+    return names
 
 
-# ──────────────────────────────────────────────
-# BMTC API: Fetch stop sequences and route parent IDs
-# ──────────────────────────────────────────────
+def get_stop_name_kn(stop_name, kn_cache):
+    """Get Kannada stop name from the table filled by resolve_kannada_names."""
+    return kn_cache.get(stop_name, stop_name)
 
-def fetch_route_parent_ids(route_numbers):
-    """Use SearchRoute_v2 to find routeparentid for each route number.
-    Optimises by grouping routes by first character and making one API call per group."""
-    print(f'Fetching route parent IDs for {len(route_numbers)} unique route numbers...')
-    parent_ids = {}
 
-    # Group route numbers by first character to minimize API calls
-    # e.g. 500-A, 500-B, 501-AC all share prefix '5' -> one API call
-    groups = {}
-    for routeno in route_numbers:
-        search_text = routeno.split(' ')[0] if ' ' in routeno else routeno
-        prefix = search_text[0] if search_text else ''
-        if prefix:
-            groups.setdefault(prefix, []).append((routeno, search_text))
+def station_route_stops(api_route_stops, stop_ids_set, nickname):
+    """Splice a route's stop sequence to start at its first main station stop.
 
-    print(f'  Grouped into {len(groups)} prefix queries: {sorted(groups.keys())}')
+    stop_ids_set holds the station stop IDs as strings and nickname is the
+    lower-cased file nickname. Returns None when the route doesn't pass through
+    any main station stop.
+    """
+    for i, stop_info in enumerate(api_route_stops):
+        if str(stop_info.get('stop_id', '')) in stop_ids_set and nickname in str(stop_info.get('stop_name', '')).replace('Banashankari Hunasemara', 'Hunasemara').lower():
+            return api_route_stops[i:]
+    return None
 
-    for prefix, route_list in groups.items():
-        cache_desc = f'SearchRoute_v2_{prefix}'
-        cached = get_cached_response(cache_desc, prefix)
 
-        if cached is not None:
-            data = cached.get('data', [])
+def collect_kannada_names(schedule, routes_kn, route_stops_api, stop_ids, file_nickname):
+    """Collect the English stop names and route from/to names the build will translate."""
+    stop_ids_set = set(str(sid) for sid in stop_ids)
+    nickname = str(file_nickname).lower()
+    stop_names = set()
+    route_names = set()
+    for route_data in schedule:
+        route_id = route_data["route-id"]
+        route_stops = station_route_stops(route_stops_api.get(route_id, []), stop_ids_set, nickname)
+        for stop_info in route_stops or []:
+            stop_names.add(stop_info['stop_name'])
+
+        route_kn = routes_kn.get(route_id, {})
+        for name in (route_kn.get('fromstation', ''), route_kn.get('tostation', '')):
+            if name and not is_kannada(name):
+                route_names.add(name)
+    return stop_names, route_names
+
+
+def kannada_tokens(text):
+    """Split a Kannada name into tokens, keeping ordinals like '10 ನೇ' together."""
+    tokens = []
+    for token in text.split():
+        if token == KN_ORDINAL_SUFFIX and tokens and tokens[-1].isdigit():
+            tokens[-1] = f'{tokens[-1]} {token}'
         else:
-            try:
-                resp = requests.post(
-                    f'{API_URL}SearchRoute_v2',
-                    headers=REQUEST_HEADERS_EN,
-                    data=json.dumps({"routetext": prefix}),
-                    timeout=30
-                )
-                result = resp.json()
-                store_cached_response(cache_desc, prefix, result)
-                data = result.get('data', [])
-            except Exception as e:
-                print(f'  SearchRoute_v2 error for prefix "{prefix}": {e}')
-                data = []
-
-        # Build lookup from API response
-        api_lookup = {}
-        for entry in data:
-            rn = entry.get('routeno', '').upper()
-            if rn not in api_lookup:
-                api_lookup[rn] = entry['routeparentid']
-
-        # Match each route in this group
-        for routeno, search_text in route_list:
-            # Exact match first
-            if routeno.upper() in api_lookup:
-                parent_ids[routeno] = api_lookup[routeno.upper()]
-            else:
-                # Prefix match fallback
-                for entry in data:
-                    if entry.get('routeno', '').upper().startswith(search_text.upper()):
-                        parent_ids[routeno] = entry['routeparentid']
-                        break
+            tokens.append(token)
+    return tokens
 
-    print(f'  Found parent IDs for {len(parent_ids)}/{len(route_numbers)} routes')
-    return parent_ids
 
+def split_token_punctuation(token):
+    """Split a token into (leading punctuation, core, trailing punctuation)."""
+    core = token.strip(KN_TOKEN_PUNCTUATION)
+    if not core:
+        return token, '', ''
+    start = token.index(core)
+    return token[:start], core, token[start + len(core):]
 
-def fetch_route_stops(route_parent_id, stop_ids, from_station_id=None):
-    """Use SearchByRouteDetails_v4 to get stop sequence for a route.
-    Returns list of {stop_id, stop_name} for the correct direction.
 
-    Direction selection priority:
-    1. If from_station_id is given, pick the direction where from_station_id appears
-       before one of our stop_ids (bus came from there, now departing onward).
-    2. Pick the direction that starts at one of our stop_ids.
-    3. Fallback to UP direction.
+def learn_kannada_tokens(kn_cache):
+    """Learn an English token -> Kannada token table from curated stop-name pairs.
+
+    Pairs whose token counts line up are aligned word by word, with punctuation
+    stripped from both sides. Each English token (case-insensitive) maps to its
+    most common Kannada counterpart, kept only if at least KN_TOKEN_MIN_AGREEMENT
+    of its occurrences agree and it won at least KN_TOKEN_MIN_OCCURRENCES of them,
+    so one misaligned or misspelt pair cannot teach a token. Ordinals vote on a
+    shared template under KN_ORDINAL_KEY, so "10th" follows the curated spelling.
     """
-    cache_desc = f'SearchByRouteDetails_v4_{route_parent_id}'
-    cached = get_cached_response(cache_desc, str(route_parent_id))
+    votes = {}  # token -> {kannada token: count}
+    for name, name_kn in kn_cache.items():
+        en = [core for _, core, _ in map(split_token_punctuation, name.split()) if core]
+        kn = [core for _, core, _ in map(split_token_punctuation, kannada_tokens(name_kn)) if core]
+        if len(en) != len(kn):
+            continue
+        for en_token, kn_token in zip(en, kn):
+            ordinal = KN_ORDINAL_RE.match(en_token)
+            if ordinal:
+                kn_ordinal = re.fullmatch(rf'{ordinal.group(1)}(\s*){KN_ORDINAL_SUFFIX}', kn_token)
+                if not kn_ordinal:
+                    continue
+                en_token = KN_ORDINAL_KEY
+                kn_token = '{n}' + kn_ordinal.group(1) + KN_ORDINAL_SUFFIX
+            counts = votes.setdefault(en_token.lower(), {})
+            counts[kn_token] = counts.get(kn_token, 0) + 1
+
+    tokens = {}
+    for en_token, counts in votes.items():
+        kn_token, count = max(counts.items(), key=lambda x: x[1])
+        if count >= KN_TOKEN_MIN_OCCURRENCES and count >= KN_TOKEN_MIN_AGREEMENT * sum(counts.values()):
+            tokens[en_token] = kn_token
+    return tokens
+
+
+def compose_kannada_name(name, kn_tokens):
+    """Translate a name token by token, keeping punctuation. Returns None if any token is unknown."""
+    parts = []
+    ordinal_template = kn_tokens.get(KN_ORDINAL_KEY, '{n}' + KN_ORDINAL_SUFFIX)
+    for token in name.split():
+        lead, core, trail = split_token_punctuation(token)
+        ordinal = KN_ORDINAL_RE.match(core)
+        if ordinal:
+            core = ordinal_template.format(n=ordinal.group(1))
+        elif core and not core.isdigit():
+            core = kn_tokens.get(core.lower())
+            if core is None:
+                return None
+        parts.append(f'{lead}{core}{trail}')
+    return ' '.join(parts)
+
+
+def resolve_kannada_names(names, kn_table, kn_tokens):
+    """Translate every name missing from kn_table and add it.
+
+    Names are composed from the learned token table; only tokens the table does
+    not cover go to Varnam, deduped and in one concurrent batch.
+    """
+    missing = sorted(name for name in names if name and name not in kn_table)
+    if not missing:
+        return 0
+
+    unseen = {}  # lower-cased core -> core as first spelled
+    for name in missing:
+        for token in name.split():
+            core = split_token_punctuation(token)[1]
+            if core and not KN_ORDINAL_RE.match(core) and not core.isdigit() and core.lower() not in kn_tokens:
+                unseen.setdefault(core.lower(), core)
+    if unseen:
+        print(f'  Transliterating {len(unseen)} unseen tokens via Varnam...')
+        words = sorted(unseen.values())
+        with concurrent.futures.ThreadPoolExecutor(max_workers=VARNAM_CONCURRENCY) as pool:
+            for word, kn in zip(words, pool.map(transliterate_varnam, words)):
+                kn_tokens[word.lower()] = kn
+
+    for name in missing:
+        kn_table[name] = compose_kannada_name(name, kn_tokens) or transliterate_varnam(name)
+    return len(missing)
 
-    if cached is not None:
-        result = cached
-    else:
-        try:
-            resp = requests.post(
-                f'{API_URL}SearchByRouteDetails_v4',
-                headers=REQUEST_HEADERS_EN,
-                data=json.dumps({"routeid": route_parent_id, "servicetypeid": 0}),
+
+# ──────────────────────────────────────────────
+# BMTC API: Fetch stop sequences
+# ──────────────────────────────────────────────
+
+def fetch_route_details(route_parent_id):
+    """SearchByRouteDetails_v4 response (up/down stop lists) for a route parent, or None."""
+    try:
+        return fetch_cached(
+            f'SearchByRouteDetails_v4_{route_parent_id}', str(route_parent_id),
+            lambda: bmtc_api.post(
+                'SearchByRouteDetails_v4',
+                json.dumps({"routeid": route_parent_id, "servicetypeid": 0}),
                 timeout=60
-            )
-            result = resp.json()
-            store_cached_response(cache_desc, str(route_parent_id), result)
-        except Exception as e:
-            print(f'  SearchByRouteDetails_v4 error for parent {route_parent_id}: {e}')
-            return []
+            ).json()
+        )
+    except Exception as e:
+        print(f'  SearchByRouteDetails_v4 error for parent {route_parent_id}: {e}')
+        return None
 
-    stop_ids_set = set(str(sid) for sid in stop_ids)
-    from_id = str(from_station_id) if from_station_id else None
 
-    def direction_stops(direction):
+def index_route_directions(result, stop_ids_set):
+    """Decode both directions of a SearchByRouteDetails_v4 response once.
+
+    Returns {direction: {'stops', 'first_index', 'last_station_index'}} where
+    first_index maps stationid -> first position in the sequence and
+    last_station_index is the last position of any of our stop IDs (-1 if none).
+    """
+    directions = {}
+    for direction in ['up', 'down']:
         data = result.get(direction, {}).get('data', [])
         if not data:
-            return None
-        return [
+            continue
+        stops = [
             {'stop_id': str(stop.get('stationid', '')), 'stop_name': stop.get('stationname', ''), 'stop_lat': stop.get('centerlat', 0), 'stop_lon': stop.get('centerlong', 0)}
             for stop in data
         ]
+        first_index = {}
+        last_station_index = -1
+        for i, stop in enumerate(stops):
+            first_index.setdefault(stop['stop_id'], i)
+            if stop['stop_id'] in stop_ids_set:
+                last_station_index = i
+        directions[direction] = {
+            'stops': stops,
+            'first_index': first_index,
+            'last_station_index': last_station_index,
+        }
+    return directions
+
+
+def select_route_direction(directions, stop_ids_set, from_station_id=None):
+    """Pick the stop sequence of one direction from index_route_directions() output.
+
+    Direction selection priority:
+    1. If from_station_id is given, pick the direction where from_station_id appears
+       before one of our stop_ids (bus came from there, now departing onward).
+    2. Pick the direction that starts at one of our stop_ids.
+    3. Fallback to UP direction.
+    """
+    from_id = str(from_station_id) if from_station_id else None
 
     # Strategy 1: use from_station_id to pick the direction where the bus came from
     # (from_station_id appears before our stop_id in the sequence)
     if from_id:
         for direction in ['up', 'down']:
-            data = result.get(direction, {}).get('data', [])
-            if not data:
-                continue
-            station_ids = [str(stop.get('stationid', '')) for stop in data]
-            try:
-                from_idx = station_ids.index(from_id)
-            except ValueError:
+            info = directions.get(direction)
+            if info is None:
                 continue
-            # Check that one of our stop_ids appears after from_idx
-            for j in range(from_idx + 1, len(station_ids)):
-                if station_ids[j] in stop_ids_set:
-                    return direction_stops(direction)
+            from_idx = info['first_index'].get(from_id)
+            if from_idx is not None and info['last_station_index'] > from_idx:
+                return info['stops']
 
     # Strategy 2: pick the direction that starts at one of our stop_ids
     for direction in ['up', 'down']:
-        data = result.get(direction, {}).get('data', [])
-        if not data:
-            continue
-        if str(data[0].get('stationid', '')) in stop_ids_set:
-            return direction_stops(direction)
+        info = directions.get(direction)
+        if info is not None and info['stops'][0]['stop_id'] in stop_ids_set:
+            return info['stops']
 
     # Fallback: return UP direction if available
-    return direction_stops('up') or []
+    return directions['up']['stops'] if 'up' in directions else []
 
 
-def fetch_all_route_stops(schedule_times, stop_ids):
+def fetch_all_route_stops(schedule, stop_ids, engine):
     """Fetch stop sequences for all received routes via the API."""
     print('Fetching stop sequences from API...')
 
-    # Collect unique route numbers
-    route_numbers = set()
-    for route_data in schedule_times["Received"]:
-        rn = route_data.get('route-number', '')
-        if rn:
-            route_numbers.add(rn)
+    # Get parent IDs for the unique route numbers
+    route_numbers = schedule.route_numbers()
+    print(f'Fetching route parent IDs for {len(route_numbers)} unique route numbers...')
+    parent_ids = fetch_route_parent_ids(route_numbers, engine)
+    print(f'  Found parent IDs for {len(parent_ids)}/{len(route_numbers)} routes')
 
-    # Get parent IDs
-    parent_ids = fetch_route_parent_ids(route_numbers)
+    # Update the schedule with parent IDs
+    for rn, parent_id in parent_ids.items():
+        for route_data in schedule.by_route_number(rn):
+            schedule.set_parent_id(route_data['route-id'], parent_id)
 
-    # Update schedule_times with parent IDs
-    for route_data in schedule_times["Received"]:
-        rn = route_data.get('route-number', '')
-        if rn in parent_ids:
-            route_data['route-parent-id'] = parent_ids[rn]
+    # Fetch each unique parent once, concurrently. Routes sharing a parent_id (opposite
+    # directions) each pick their own direction, using from_station_id, from that response.
+    stop_ids_set = set(str(sid) for sid in stop_ids)
+    parents = schedule.parent_ids()
+    futures = {parent_id: engine.submit(fetch_route_details, parent_id) for parent_id in parents}
+    print(f'  Fetching {len(parents)} unique route parents')
 
-    # Fetch stop sequences for each route, using from_station_id to pick the correct direction.
-    # Routes sharing the same parent_id (opposite directions) each get their own sequence.
     route_stops = {}  # route_id -> [{'stop_id', 'stop_name'}]
 
-    for route_data in schedule_times["Received"]:
-        route_id = route_data["route-id"]
-        parent_id = route_data.get('route-parent-id', '')
-        from_station_id = route_data.get('from-station-id', '')
-        if not parent_id:
+    for parent_id, future in futures.items():
+        result = future.result()
+        if result is None:
             continue
-
-        stops = fetch_route_stops(parent_id, stop_ids, from_station_id)
-        if stops:
-            route_stops[route_id] = stops
+        directions = index_route_directions(result, stop_ids_set)
+        for route_data in schedule.by_parent_id(parent_id):
+            stops = select_route_direction(directions, stop_ids_set, route_data.get('from-station-id', ''))
+            if stops:
+                route_stops[route_data["route-id"]] = stops
 
     print(f'  Fetched stop sequences for {len(route_stops)} routes')
     return route_stops
@@ -652,7 +1169,30 @@ def fetch_all_route_stops(schedule_times, stop_ids):
 # Build output GeoJSON
 # ──────────────────────────────────────────────
 
-def smart_match_platform(route_number, platforms_routes, platform_route_ids):
+class PlatformRouteIndex:
+    """Route-number counts per platform, kept up to date as build_geojson assigns routes.
+
+    numbers maps an assigned route number to {platform: count}; families maps a
+    base number ("500" for "500-A") to {platform: count}. UNKNOWN / UNSORTED are
+    not indexed. Ties go to the platform listed first in platform_order.
+    """
+
+    def __init__(self, platform_order):
+        self.order = {name: i for i, name in enumerate(platform_order)}
+        self.numbers = {}
+        self.families = {}
+
+    def add(self, platform, route_number):
+        if platform in ["UNKNOWN", "UNSORTED"] or not route_number:
+            return
+        counts = self.numbers.setdefault(route_number, {})
+        counts[platform] = counts.get(platform, 0) + 1
+        if '-' in route_number:
+            counts = self.families.setdefault(route_number.split('-')[0], {})
+            counts[platform] = counts.get(platform, 0) + 1
+
+
+def smart_match_platform(route_number, route_index):
     """Intelligently match a route to a platform based on route number patterns.
 
     Tries:
@@ -664,17 +1204,14 @@ def smart_match_platform(route_number, platforms_routes, platform_route_ids):
     if not route_number:
         return None
 
-    # Check for exact prefix matches first (e.g., "13-C" exists for "13-C SGH-ISROL")
-    for platform_name in platforms_routes:
-        if platform_name in ["UNKNOWN", "UNSORTED"]:
-            continue
-
-        routes_on_platform = platforms_routes[platform_name]
-        for rd in routes_on_platform:
-            existing_route_num = rd.get('route-number', '')
-            # Check if route_number starts with an existing route number
-            if existing_route_num and route_number.startswith(existing_route_num + ' '):
-                return platform_name
+    # Check for exact prefix matches first (e.g., "13-C" exists for "13-C SGH-ISROL"):
+    # every prefix of route_number ending before a space is a candidate
+    candidates = set()
+    for i, ch in enumerate(route_number):
+        if ch == ' ':
+            candidates.update(route_index.numbers.get(route_number[:i], ()))
+    if candidates:
+        return min(candidates, key=route_index.order.get)
 
     # Extract base route number (e.g., "13" from "13-S", "500" from "500-A")
     # Handle formats like "13-S", "500-A", "G-4", etc.
@@ -682,35 +1219,17 @@ def smart_match_platform(route_number, platforms_routes, platform_route_ids):
     if len(parts) < 2:
         return None
 
-    base_number = parts[0]  # e.g., "13", "500", "G"
-
-    # Count occurrences of routes with this base number on each platform
-    platform_counts = {}
-    for platform_name in platforms_routes:
-        if platform_name in ["UNKNOWN", "UNSORTED"]:
-            continue
-
-        count = 0
-        routes_on_platform = platforms_routes[platform_name]
-        for rd in routes_on_platform:
-            existing_route_num = rd.get('route-number', '')
-            if existing_route_num and existing_route_num.startswith(base_number + '-'):
-                count += 1
-
-        if count > 0:
-            platform_counts[platform_name] = count
-
-    # Return platform with most matching routes
+    # Return platform with most routes of this base number
+    platform_counts = route_index.families.get(parts[0])
     if platform_counts:
-        best_platform = max(platform_counts.items(), key=lambda x: x[1])
-        return best_platform[0]
+        return min(platform_counts, key=lambda name: (-platform_counts[name], route_index.order[name]))
 
     return None
 
 
 def build_geojson(
-    schedule_times, routes_en, routes_kn, stop_platforms,
-    platforms_geojson, overrides, stop_ids, kn_cache, route_stops_api, file_nickname
+    schedule, routes_en, routes_kn, stop_platforms,
+    platforms_geojson, overrides, stop_ids, kn_cache, kn_route_names, route_stops_api, file_nickname
 ):
     """Build the output GeoJSON matching the current app format."""
     print('Building output GeoJSON...')
@@ -737,16 +1256,27 @@ def build_geojson(
 
     # Track which route numbers are already assigned to each platform to avoid duplicates
     platform_route_ids = {name: set() for name in platforms_routes}
+    route_index = PlatformRouteIndex(platforms_routes)
 
-    for route_data in schedule_times["Received"]:
+    def assign(platform, route_data):
+        platform_route_ids[platform].add(route_data["route-id"])
+        platforms_routes[platform].append(route_data)
+        route_index.add(platform, route_data.get('route-number', ''))
+
+    # Routes departing from a stop listed in stop-platforms.json
+    manual_platforms = {}  # route_id -> platform
+    for station_id, station_platform in stop_platforms.items():
+        for route_data in schedule.by_from_station(station_id):
+            manual_platforms[route_data["route-id"]] = station_platform.upper()
+
+    for route_data in schedule:
         route_id = route_data["route-id"]
-        from_station_id = str(route_data.get("from-station-id", ""))
         route_number = route_data.get('route-number', '')
 
         # Determine platform: stop-platforms mapping > overrides > API platform name/number
         is_manual_override = False
-        if from_station_id in stop_platforms:
-            platform = stop_platforms[from_station_id].upper()
+        if route_id in manual_platforms:
+            platform = manual_platforms[route_id]
             is_manual_override = True
         elif str(route_id) in overrides:
             platform = str(overrides[str(route_id)]).upper()
@@ -757,7 +1287,7 @@ def build_geojson(
 
         # Smart matching: only apply if not from stop-platforms.json and no platform found yet
         if not platform and not is_manual_override:
-            smart_platform = smart_match_platform(route_number, platforms_routes, platform_route_ids)
+            smart_platform = smart_match_platform(route_number, route_index)
             if smart_platform:
                 platform = smart_platform
                 print(f'  Smart matched route {route_number} to platform {platform}')
@@ -769,8 +1299,7 @@ def build_geojson(
             # Deduplicate: skip if this route is already assigned to this platform
             if route_id in platform_route_ids[platform]:
                 continue
-            platform_route_ids[platform].add(route_id)
-            platforms_routes[platform].append(route_data)
+            assign(platform, route_data)
         else:
             platforms_routes["UNSORTED"].append(route_data)
 
@@ -778,7 +1307,7 @@ def build_geojson(
     # If a route passes through a stop in stop_platforms, add it to that platform too
     print('Cross-checking stop sequences against stop-platforms...')
     additional_assignments = 0
-    for route_data in schedule_times["Received"]:
+    for route_data in schedule:
         route_id = route_data["route-id"]
         route_number = route_data.get('route-number', '')
 
@@ -796,14 +1325,74 @@ def build_geojson(
                 # Add to this platform if not already there
                 if platform in platforms_routes:
                     if route_id not in platform_route_ids[platform]:
-                        platform_route_ids[platform].add(route_id)
-                        platforms_routes[platform].append(route_data)
+                        assign(platform, route_data)
                         additional_assignments += 1
                         print(f'  Added route {route_number} to platform {platform} (passes through stop {stop_id})')
                 break  # Only use the first informal stop match
 
     print(f'Added {additional_assignments} additional route assignments based on stop sequences')
 
+    # Per-route output fields, computed once per route ID and shared by every
+    # platform the route is assigned to (only PlatformNumber differs).
+    stop_ids_set = set(str(sid) for sid in stop_ids)
+    nickname = str(file_nickname).lower()
+    route_templates = {}  # route_id -> route object, or None if it skips our station
+
+    def route_template(route_data, route_number):
+        route_id = route_data["route-id"]
+        if route_id in route_templates:
+            return route_templates[route_id]
+
+        route_en = routes_en.get(route_id, {})
+
+        # Use fromstation as Area (general area), tostation as Destination
+        # Via can be derived from route name or left empty
+        area = route_en.get('fromstation', '')
+        via = ''  # API doesn't provide a direct "via" field
+
+        # Kannada info
+        kn_from, kn_to = get_kannada_route_info(routes_kn, route_id, kn_route_names)
+
+        # Get stop sequence from API, spliced to only include stops from our station onwards
+        api_route_stops = station_route_stops(route_stops_api.get(route_id, []), stop_ids_set, nickname)
+
+        # Skip routes that don't pass through any main station stop
+        # (e.g. routes only assigned via informal stop cross-check)
+        if api_route_stops is None:
+            route_templates[route_id] = None
+            return None
+
+        stops = [
+            {
+                'name': stop_info['stop_name'],
+                'name_kn': get_stop_name_kn(stop_info['stop_name'], kn_cache),
+                'stop_id': stop_info['stop_id'],
+                'lat': stop_info['stop_lat'],
+                'lon': stop_info['stop_lon']
+            }
+            for stop_info in api_route_stops
+        ]
+
+        # Use last stop name as destination
+        destination = stops[-1]['name'] if stops else route_en.get('tostation', '')
+        kn_destination = stops[-1]['name_kn'] if stops else kn_to
+
+        route_templates[route_id] = {
+            'Route': route_number,
+            'RouteId': route_id,
+            'RouteParentId': route_data.get('route-parent-id', ''),
+            'Destination': destination,
+            'Via': via,
+            'Area': area,
+            'PlatformNumber': '',
+            'KannadaDestination': kn_destination,
+            'KannadaArea': kn_from,
+            'KannadaVia': '',
+            'FromStationId': route_data.get('from-station-id', ''),
+            'Stops': stops
+        }
+        return route_templates[route_id]
+
     # Build features
     features = []
     for plat_name, geometry in platform_geom_lookup.items():
@@ -816,75 +1405,16 @@ def build_geojson(
         seen_route_numbers = set()
         for route_data in route_list:
             route_id = route_data["route-id"]
-            route_en = routes_en.get(route_id, {})
-
-            # English info
-            from_station = route_en.get('fromstation', '')
-            route_number = route_data.get('route-number', route_en.get('routeno', ''))
+            route_number = route_data.get('route-number', routes_en.get(route_id, {}).get('routeno', ''))
 
             # De-duplicate by route number within the same platform
             if route_number in seen_route_numbers:
                 continue
             seen_route_numbers.add(route_number)
 
-            # Use fromstation as Area (general area), tostation as Destination
-            # Via can be derived from route name or left empty
-            route_name = route_data.get('route-name', route_en.get('routeno', ''))
-            area = from_station
-            via = ''  # API doesn't provide a direct "via" field
-
-            # Kannada info
-            kn_from, kn_to = get_kannada_route_info(routes_kn, route_id)
-
-            # Get stop sequence from API
-            stops = []
-            api_route_stops = route_stops_api.get(route_id, [])
-
-            # Find the first occurrence of any of our stop IDs
-            first_stop_index = None
-            for i, stop_info in enumerate(api_route_stops):
-                if str(stop_info.get('stop_id', '')) in [str(sid) for sid in stop_ids] and str(file_nickname).lower() in str(stop_info.get('stop_name', '')).replace('Banashankari Hunasemara', 'Hunasemara').lower():
-                    first_stop_index = i
-                    break
-
-            # Skip routes that don't pass through any main station stop
-            # (e.g. routes only assigned via informal stop cross-check)
-            if first_stop_index is None:
-                continue
-
-            # Splice to only include stops from our station onwards
-            api_route_stops = api_route_stops[first_stop_index:]
-
-            for stop_info in api_route_stops:
-                stop_name = stop_info['stop_name']
-                stop_kn = get_stop_name_kn(stop_name, kn_cache)
-                stops.append({
-                    'name': stop_name,
-                    'name_kn': stop_kn,
-                    'stop_id': stop_info['stop_id'],
-                    'lat': stop_info['stop_lat'],
-                    'lon': stop_info['stop_lon']
-                })
-
-            # Use last stop name as destination
-            destination = stops[-1]['name'] if stops else route_en.get('tostation', '')
-            kn_destination = stops[-1]['name_kn'] if stops else kn_to
-
-            route_obj = {
-                'Route': route_number,
-                'RouteId': route_id,
-                'RouteParentId': route_data.get('route-parent-id', ''),
-                'Destination': destination,
-                'Via': via,
-                'Area': area,
-                'PlatformNumber': plat_name,
-                'KannadaDestination': kn_destination,
-                'KannadaArea': kn_from,
-                'KannadaVia': '',
-                'FromStationId': route_data.get('from-station-id', ''),
-                'Stops': stops
-            }
-            routes.append(route_obj)
+            template = route_template(route_data, route_number)
+            if template is not None:
+                routes.append({**template, 'PlatformNumber': plat_name})
 
         if routes:
             feature = {
@@ -915,39 +1445,308 @@ def build_geojson(
     return geojson, platforms_routes
 
 
+# ──────────────────────────────────────────────
+# Output formats
+# ──────────────────────────────────────────────
+
+class StopTable:
+    """Deduplicated list of stop objects, handing out indices for --normalized output."""
+
+    def __init__(self):
+        self.stops = []
+        self._index = {}  # stop fields -> index in stops
+
+    def index_of(self, stop):
+        key = (stop['stop_id'], stop['name'], stop['name_kn'], stop['lat'], stop['lon'])
+        if key not in self._index:
+            self._index[key] = len(self.stops)
+            self.stops.append(stop)
+        return self._index[key]
+
+
+def normalize_geojson(geojson):
+    """Move route stops into one deduplicated stop table.
+
+    Returns a copy of the GeoJSON with a top-level "StopTable" list of
+    {name, name_kn, stop_id, lat, lon} objects, and each route's "Stops"
+    replaced by indices into it. The app's loader expands it back.
+    """
+    table = StopTable()
+    features = []
+    for feature in geojson['features']:
+        routes = [
+            {**route, 'Stops': [table.index_of(stop) for stop in route['Stops']]}
+            for route in feature['properties']['Routes']
+        ]
+        features.append({**feature, 'properties': {**feature['properties'], 'Routes': routes}})
+
+    return {'type': 'FeatureCollection', 'StopTable': table.stops, 'features': features}
+
+
+def normalize_shard(shard):
+    """normalize_geojson for one platform shard (see shard_geojson)."""
+    table = StopTable()
+    stops = {route_id: [table.index_of(stop) for stop in route_stops] for route_id, route_stops in shard['Stops'].items()}
+    return {'Platform': shard['Platform'], 'StopTable': table.stops, 'Stops': stops}
+
+
+def shard_geojson(geojson, output_path):
+    """Split the output into a light platform index and one stops shard per platform.
+
+    The index keeps every feature and route field except each route's "Stops"; each
+    feature gains a "Shard" property naming its shard file,
+    <output stem>.<platform>.json, which holds {"Platform", "Stops": {route_id: stops}}.
+    Returns (index, {shard path: shard}).
+    """
+    stem = os.path.splitext(output_path)[0]
+    features = []
+    shards = {}
+    for feature in geojson['features']:
+        properties = feature['properties']
+        platform = properties['Platform']
+        shard_path = f'{stem}.{re.sub(r"[^A-Za-z0-9_-]+", "-", platform)}.json'
+        shards[shard_path] = {
+            'Platform': platform,
+            'Stops': {str(route['RouteId']): route['Stops'] for route in properties['Routes']},
+        }
+        routes = [{k: v for k, v in route.items() if k != 'Stops'} for route in properties['Routes']]
+        features.append({
+            **feature,
+            'properties': {**properties, 'Routes': routes, 'Shard': os.path.basename(shard_path)},
+        })
+    return {'type': 'FeatureCollection', 'features': features}, shards
+
+
+def encode_polyline(points, precision=COORDINATE_PRECISION):
+    """Encode (lat, lon) pairs with the polyline algorithm.
+
+    Coordinates are rounded to fixed-point integers at the given number of decimal
+    places, and each point is written as the zigzag-encoded delta from the previous
+    one in 5-bit chunks offset into printable ASCII. Nearby points (consecutive stops
+    of a route) take a few characters each instead of two full floats.
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return ''.join(chunks)
+
+
+def encode_stop_coordinates(stops):
+    """Split a stop list into (stops without lat/lon, polyline of their coordinates)."""
+    coords = encode_polyline((stop['lat'], stop['lon']) for stop in stops)
+    return [{k: v for k, v in stop.items() if k not in ('lat', 'lon')} for stop in stops], coords
+
+
+def encode_output_coordinates(data):
+    """Polyline-encode the stop coordinates of a platforms output (--encoded-coords).
+
+    Works on the GeoJSON and on shards, plain or normalized: a "StopTable" is
+    encoded into "StopTableCoords", otherwise each route's stop list gets a
+    "StopCoords" string (a {route_id: string} map in shards). "CoordPrecision"
+    tells the app's decoder the fixed-point scale.
+    """
+    data = {**data, 'CoordPrecision': COORDINATE_PRECISION}
+    if 'StopTable' in data:
+        data['StopTable'], data['StopTableCoords'] = encode_stop_coordinates(data['StopTable'])
+    elif 'features' in data:
+        features = []
+        for feature in data['features']:
+            routes = []
+            for route in feature['properties']['Routes']:
+                if 'Stops' in route:
+                    stops, coords = encode_stop_coordinates(route['Stops'])
+                    route = {**route, 'Stops': stops, 'StopCoords': coords}
+                routes.append(route)
+            features.append({**feature, 'properties': {**feature['properties'], 'Routes': routes}})
+        data['features'] = features
+    else:
+        encoded = {route_id: encode_stop_coordinates(stops) for route_id, stops in data['Stops'].items()}
+        data['Stops'] = {route_id: stops for route_id, (stops, _) in encoded.items()}
+        data['StopCoords'] = {route_id: coords for route_id, (_, coords) in encoded.items()}
+    return data
+
+
+def encode_stops_coordinates(stops_coordinates):
+    """--encoded-coords form of stops-coordinates.json.
+
+    {stop_id: {name, lat, lon}} becomes {"CoordPrecision", "StopIds", "Names",
+    "Coords"}: parallel lists (object key order is not preserved for numeric IDs
+    in JavaScript) plus one polyline over all stops, ordered by latitude so
+    consecutive deltas stay small.
+    """
+    stop_ids = sorted(stops_coordinates, key=lambda sid: (stops_coordinates[sid]['lat'], stops_coordinates[sid]['lon']))
+    return {
+        'CoordPrecision': COORDINATE_PRECISION,
+        'StopIds': stop_ids,
+        'Names': [stops_coordinates[sid]['name'] for sid in stop_ids],
+        'Coords': encode_polyline((stops_coordinates[sid]['lat'], stops_coordinates[sid]['lon']) for sid in stop_ids),
+    }
+
+
+def build_stop_grid(stops_coordinates, cell_degrees=STOP_GRID_CELL_DEGREES):
+    """Bucket stops into a lat/lon grid for nearest-stop queries (stops-grid.json).
+
+    Each stop goes into the cell floor(lat / cell_degrees):floor(lon / cell_degrees),
+    so the app can compute the cell of any point and read only the cells around it.
+    Every bucket keeps the tight [min_lat, min_lon, max_lat, max_lon] bounds of its
+    stops (to skip buckets that cannot hold a closer stop) and its stop IDs, which
+    key into stops-coordinates.json. "Bounds" covers all stops.
+    """
+    buckets = {}
+    for stop_id, info in stops_coordinates.items():
+        lat, lon = info['lat'], info['lon']
+        key = f'{math.floor(lat / cell_degrees)}:{math.floor(lon / cell_degrees)}'
+        bucket = buckets.setdefault(key, {'Bounds': [lat, lon, lat, lon], 'StopIds': []})
+        bounds = bucket['Bounds']
+        bucket['Bounds'] = [min(bounds[0], lat), min(bounds[1], lon), max(bounds[2], lat), max(bounds[3], lon)]
+        bucket['StopIds'].append(stop_id)
+
+    all_bounds = [bucket['Bounds'] for bucket in buckets.values()]
+    return {
+        'CellDegrees': cell_degrees,
+        'Bounds': [
+            min(b[0] for b in all_bounds), min(b[1] for b in all_bounds),
+            max(b[2] for b in all_bounds), max(b[3] for b in all_bounds),
+        ] if all_bounds else None,
+        'Buckets': dict(sorted(buckets.items())),
+    }
+
+
+def remove_platform_shards(output_path):
+    """Delete the shard files (plain and hashed) of an earlier --sharded run for output_path."""
+    stem = os.path.splitext(output_path)[0]
+    for shard_path in glob.glob(f'{glob.escape(stem)}.*.json*'):
+        os.remove(shard_path)
+
+
+def update_data_manifest(name, published_name):
+    """Point the app's data manifest at published_name for name (None removes the entry).
+
+    Entries whose published file no longer exists (e.g. shards of an earlier
+    --sharded run) are pruned on every update.
+    """
+    manifest = {}
+    if os.path.exists(DATA_MANIFEST_PATH):
+        with open(DATA_MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    data_dir = os.path.dirname(DATA_MANIFEST_PATH)
+    pruned = {k: v for k, v in manifest.items() if os.path.exists(os.path.join(data_dir, v))}
+    if published_name is None:
+        pruned.pop(name, None)
+    else:
+        pruned[name] = published_name
+    if pruned == manifest:
+        return
+    manifest = pruned
+    os.makedirs(os.path.dirname(DATA_MANIFEST_PATH), exist_ok=True)
+    with open(DATA_MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=2)
+
+
+def remove_hashed_copies(path, keep=None):
+    """Delete the release copies of path (<stem>.<hash><ext> and their .gz/.br), except keep."""
+    stem, ext = os.path.splitext(path)
+    for old_path in glob.glob(f'{glob.escape(stem)}.{"[0-9a-f]" * CONTENT_HASH_LENGTH}{ext}*'):
+        if keep is None or not old_path.startswith(keep):
+            os.remove(old_path)
+
+
+def write_output_json(path, data, release=False):
+    """Write an app data file and return the path written.
+
+    Normally this is indented JSON under its fixed name. In release mode the JSON
+    is minified and written as <stem>.<content hash><ext> with precompressed
+    .gz (and .br when brotli is installed) siblings, and the manifest maps the
+    fixed name to the new file. Either way, hashed copies from earlier release
+    runs are removed.
+    """
+    name = os.path.basename(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not release:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        remove_hashed_copies(path)
+        update_data_manifest(name, None)
+        return path
+
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    stem, ext = os.path.splitext(path)
+    content_hash = hashlib.sha256(payload).hexdigest()[:CONTENT_HASH_LENGTH]
+    hashed_path = f'{stem}.{content_hash}{ext}'
+    remove_hashed_copies(path, keep=hashed_path)
+
+    with open(hashed_path, 'wb') as f:
+        f.write(payload)
+    with open(f'{hashed_path}.gz', 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f'{hashed_path}.br', 'wb') as f:
+            f.write(brotli.compress(payload, quality=11))
+
+    update_data_manifest(name, os.path.basename(hashed_path))
+    return hashed_path
+
+
 # ──────────────────────────────────────────────
 # Main
 # ──────────────────────────────────────────────
 
 def main():
     # Parse command-line arguments
-    # Usage: python generate-geojson.py <stop_id1> [stop_id2 ...] <nickname> [nest_level]
-    if len(sys.argv) < 3:
-        print('Usage: python generate-geojson.py <stop_id1> [stop_id2 ...] <nickname> [nest_level]')
+    # Usage: python generate-geojson.py <stop_id1> [stop_id2 ...] <nickname> [nest_level] [--async] [--stale] [--dated-cache] [--normalized] [--sharded] [--release] [--encoded-coords]
+    # Flags (--name) may appear anywhere; everything else is positional
+    flags = {arg for arg in sys.argv[1:] if arg.startswith('--')}
+    argv = [arg for arg in sys.argv if not arg.startswith('--')]
+    fetch_mode = 'async' if '--async' in flags else FETCH_MODE
+    stale_while_revalidate = '--stale' in flags or api_cache.STALE_WHILE_REVALIDATE
+    date_independent_keys = '--dated-cache' not in flags and api_cache.DATE_INDEPENDENT_KEYS
+    normalized_output = '--normalized' in flags or NORMALIZED_OUTPUT
+    sharded_output = '--sharded' in flags or SHARDED_OUTPUT
+    release_output = '--release' in flags or RELEASE_OUTPUT
+    encoded_coordinates = '--encoded-coords' in flags or ENCODED_COORDINATES
+
+    if len(argv) < 3:
+        print('Usage: python generate-geojson.py <stop_id1> [stop_id2 ...] <nickname> [nest_level] [--async] [--stale] [--dated-cache] [--normalized] [--sharded] [--release] [--encoded-coords]')
         print('Example: python generate-geojson.py 20621 20623 banashankari 2')
         print('Using default options')
         nest_level = 2
         file_nickname = 'banashankari'
         stop_ids = ['21149', '20621', '22459', '21711', '22062', '20897', '20623', '39241']
     else:
-        if sys.argv[-1].isdigit() and not sys.argv[-2].isdigit():
+        if argv[-1].isdigit() and not argv[-2].isdigit():
             # Last arg is nest_level, second-to-last is nickname
-            nest_level = int(sys.argv[-1])
-            file_nickname = sys.argv[-2]
-            stop_ids = sys.argv[1:-2]
-        elif sys.argv[-1].isdigit():
+            nest_level = int(argv[-1])
+            file_nickname = argv[-2]
+            stop_ids = argv[1:-2]
+        elif argv[-1].isdigit():
             # All digits — ambiguous, treat last as nest_level
-            nest_level = int(sys.argv[-1])
-            file_nickname = sys.argv[-2]
-            stop_ids = sys.argv[1:-2]
+            nest_level = int(argv[-1])
+            file_nickname = argv[-2]
+            stop_ids = argv[1:-2]
         else:
             nest_level = 2
-            file_nickname = sys.argv[-1]
-            stop_ids = sys.argv[1:-1]
+            file_nickname = argv[-1]
+            stop_ids = argv[1:-1]
 
         print(f'Stop IDs: {stop_ids}')
         print(f'Nickname: {file_nickname}')
         print(f'Nest level: {nest_level}')
+    print(f'Fetch mode: {fetch_mode}')
+    if release_output:
+        print(f'Release output: minified, content-hashed files{"" if brotli else " (brotli not installed, .gz only)"}')
+    if stale_while_revalidate:
+        print('Serving stale cache entries while revalidating in the background')
+    if not date_independent_keys:
+        print('Timetable cache entries are keyed by request date')
 
     # File paths
     platforms_geojson_path = f'input/platforms-{file_nickname}.geojson'
@@ -957,8 +1756,10 @@ def main():
     raw_output_path = f'raw/platforms-{file_nickname}.json'
 
     # Initialize cache
-    init_cache_db()
-    cleanup_expired_cache()
+    api_cache.configure(stale_while_revalidate=stale_while_revalidate, date_independent_keys=date_independent_keys)
+    api_cache.init_cache_db()
+    api_cache.cleanup_expired_cache()
+    api_cache.warm_cache(CACHE_WARM_ENDPOINTS)
 
     # Load config files
     with open(platforms_geojson_path, encoding='utf-8') as f:
@@ -988,62 +1789,84 @@ def main():
                     overrides[key] = val
 
     # Step 1: Discover neighboring stops from GTFS
-    next_stops = get_next_stops(stop_ids, nest_level=nest_level)
+    gtfs_snapshot = load_gtfs_snapshot()
+    next_stops = get_next_stops(stop_ids, nest_level=nest_level, snapshot=gtfs_snapshot)
+
+    engine = FetchEngine(mode=fetch_mode, max_workers=MAX_WORKERS)
 
     # Step 2: Fetch all routes
-    routes_en, routes_kn = fetch_all_routes()
+    routes_en, routes_kn = fetch_all_routes(engine)
 
     # Step 3: Fetch platform assignments
-    schedule_times = fetch_platform_assignments(stop_ids, next_stops, overrides, nest_level)
+    schedule = fetch_platform_assignments(stop_ids, next_stops, overrides, engine, nest_level)
 
     # Step 3b: Find routes with matching fromstationid missing from bulk queries and fetch them
-    received_route_ids = {r['route-id'] for r in schedule_times['Received']}
     stop_ids_set = set(str(s) for s in stop_ids)
     missing_route_ids = [
         route_id for route_id, route in routes_en.items()
         if str(route.get('fromstationid', '')) in stop_ids_set
-        and route_id not in received_route_ids
+        and route_id not in schedule
     ]
     if missing_route_ids:
         print(f'Found {len(missing_route_ids)} routes with matching fromstationid absent from bulk queries')
-        missing_received = fetch_missing_routes_by_id(missing_route_ids, routes_en, overrides)
-        schedule_times['Received'].extend(missing_received)
+        missing_received = fetch_missing_routes_by_id(missing_route_ids, routes_en, overrides, engine)
+        for route_data in missing_received:
+            schedule.upsert(route_data)
 
     # Save raw data
     os.makedirs('raw', exist_ok=True)
     with open(raw_output_path, 'w', encoding='utf-8') as f:
-        json.dump(schedule_times, f, indent=2, ensure_ascii=False)
+        json.dump(schedule.to_dict(), f, indent=2, ensure_ascii=False)
     print(f'Saved raw data to {raw_output_path}')
 
     # Step 4: Fetch stop sequences from API (SearchRoute_v2 + SearchByRouteDetails_v4)
-    route_stops_api = fetch_all_route_stops(schedule_times, stop_ids)
-
-    # Step 5: Build Kannada cache
-    kn_cache = {}
-    # Load existing Kannada translations if available
-    kn_csv_path = 'input/bus-stops-kn.csv'
-    if os.path.exists(kn_csv_path):
-        try:
-            with open(kn_csv_path, encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    kn_cache[row['stop_name']] = row['stop_name_kn']
-            print(f'Loaded {len(kn_cache)} existing Kannada translations')
-        except Exception as e:
-            print(f'WARNING: Could not load {kn_csv_path}: {e}')
+    route_stops_api = fetch_all_route_stops(schedule, stop_ids, engine)
+
+    # Step 5: Build Kannada cache. Generated names live in their own file so they
+    # are never learned from: only curated rows teach the token table.
+    kn_curated = load_kannada_csv(KN_CURATED_CSV_PATH)
+    kn_cache = {**load_kannada_csv(KN_GENERATED_CSV_PATH), **kn_curated}
+    print(f'Loaded {len(kn_curated)} curated and {len(kn_cache) - len(kn_curated)} generated Kannada translations')
+
+    # Step 5b: Translate every stop / route name the build needs, in one batch
+    print('Resolving Kannada names...')
+    stop_names, route_names = collect_kannada_names(schedule, routes_kn, route_stops_api, stop_ids, file_nickname)
+    kn_tokens = learn_kannada_tokens(kn_curated)
+    print(f'  Learned {len(kn_tokens)} Kannada tokens from curated names')
+    resolve_kannada_names(stop_names, kn_cache, kn_tokens)
+    kn_route_names = {}
+    resolve_kannada_names(route_names, kn_route_names, kn_tokens)
+    print(f'  {len(stop_names)} stop names, {len(route_names)} route names')
+
+    # Last network stage done
+    engine.close()
 
     # Step 6: Build output GeoJSON
     geojson, platforms_routes = build_geojson(
-        schedule_times, routes_en, routes_kn, stop_platforms,
-        platforms_geojson, overrides, stop_ids, kn_cache,
+        schedule, routes_en, routes_kn, stop_platforms,
+        platforms_geojson, overrides, stop_ids, kn_cache, kn_route_names,
         route_stops_api, file_nickname
     )
 
-    # Write output
-    os.makedirs(os.path.dirname(output_geojson_path), exist_ok=True)
-    with open(output_geojson_path, 'w', encoding='utf-8') as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
-    print(f'Wrote {len(geojson["features"])} platform features to {output_geojson_path}')
+    # Write output (replacing any shards of an earlier --sharded run)
+    remove_platform_shards(output_geojson_path)
+    if sharded_output:
+        output_geojson, shards = shard_geojson(geojson, output_geojson_path)
+        for shard_path, shard in shards.items():
+            if normalized_output:
+                shard = normalize_shard(shard)
+            if encoded_coordinates:
+                shard = encode_output_coordinates(shard)
+            write_output_json(shard_path, shard, release_output)
+        print(f'  Sharded: {len(shards)} platform stop shards next to the index')
+    else:
+        output_geojson = normalize_geojson(geojson) if normalized_output else geojson
+        if encoded_coordinates:
+            output_geojson = encode_output_coordinates(output_geojson)
+    written_path = write_output_json(output_geojson_path, output_geojson, release_output)
+    print(f'Wrote {len(geojson["features"])} platform features to {written_path}')
+    if normalized_output and not sharded_output:
+        print(f'  Normalized: {len(output_geojson["StopTable"])} unique stops in the stop table')
 
     # Step 7: Filter and write stops-coordinates.json
     # Collect all unique stop IDs from the geojson
@@ -1055,27 +1878,26 @@ def main():
                 if stop_id:
                     stop_ids_in_geojson.add(stop_id)
 
-    # Load GTFS stops to get coordinates
-    stops_txt_path = os.path.join(GTFS_FOLDER, 'stops.txt')
+    # Look up coordinates in the GTFS snapshot (kept in stops.txt order)
     stops_coordinates = {}
-    if os.path.exists(stops_txt_path):
-        with open(stops_txt_path, encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                stop_id = row['stop_id']
-                if stop_id in stop_ids_in_geojson:
-                    stops_coordinates[stop_id] = {
-                        'name': row['stop_name'],
-                        'lat': float(row['stop_lat']),
-                        'lon': float(row['stop_lon'])
-                    }
+    stop_lookup = gtfs_snapshot['stop_lookup']
+    for stop_id in sorted(stop_ids_in_geojson, key=lambda sid: stop_lookup.get(sid, -1)):
+        info = snapshot_stop_info(gtfs_snapshot, stop_id)
+        if info is not None:
+            stops_coordinates[stop_id] = info
 
     # Write filtered stops-coordinates.json
     stops_coords_path = f'static/data/stops-coordinates.json'
-    os.makedirs(os.path.dirname(stops_coords_path), exist_ok=True)
-    with open(stops_coords_path, 'w', encoding='utf-8') as f:
-        json.dump(stops_coordinates, f, ensure_ascii=False, indent=2)
-    print(f'Wrote {len(stops_coordinates)} stop coordinates to {stops_coords_path}')
+    if encoded_coordinates:
+        written_path = write_output_json(stops_coords_path, encode_stops_coordinates(stops_coordinates), release_output)
+    else:
+        written_path = write_output_json(stops_coords_path, stops_coordinates, release_output)
+    print(f'Wrote {len(stops_coordinates)} stop coordinates to {written_path}')
+
+    # Step 8: Spatial index over those stops for the app's nearest-stop search
+    stop_grid = build_stop_grid(stops_coordinates)
+    written_path = write_output_json('static/data/stops-grid.json', stop_grid, release_output)
+    print(f'Wrote {len(stop_grid["Buckets"])} stop grid buckets to {written_path}')
 
     # Save unknown/unsorted
     unknown = platforms_routes.get("UNKNOWN", [])
@@ -1086,25 +1908,22 @@ def main():
             json.dump({"Unknown": unknown, "Unsorted": unsorted}, f, indent=2, ensure_ascii=False)
         print(f'Saved {len(unknown)} unknown + {len(unsorted)} unsorted routes to help/platforms-unaccounted-{file_nickname}.json')
 
-    # Save updated Kannada cache
-    if kn_cache:
-        with open(kn_csv_path, 'w', encoding='utf-8', newline='') as f:
+    # Save generated Kannada names (the curated CSV is left untouched)
+    kn_generated = {name: kn for name, kn in kn_cache.items() if name not in kn_curated}
+    if kn_generated:
+        with open(KN_GENERATED_CSV_PATH, 'w', encoding='utf-8', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(['stop_name', 'stop_name_kn'])
-            for stop_name in sorted(kn_cache):
-                writer.writerow([stop_name, kn_cache[stop_name]])
-        print(f'Updated Kannada cache: {len(kn_cache)} entries in {kn_csv_path}')
+            for stop_name in sorted(kn_generated):
+                writer.writerow([stop_name, kn_generated[stop_name]])
+        print(f'Updated generated Kannada names: {len(kn_generated)} entries in {KN_GENERATED_CSV_PATH}')
 
     # Print cache stats
     try:
-        conn = sqlite3.connect(CACHE_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM api_cache')
-        total = cursor.fetchone()[0]
-        conn.close()
-        print(f'API cache contains {total} entries')
+        print(f'API cache contains {api_cache.count_entries()} entries')
     except Exception:
         pass
+    api_cache.close()
 
     print(f'Completed {file_nickname}')
 
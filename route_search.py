@@ -0,0 +1,120 @@
+"""
+Route number -> routeparentid resolver shared by generate-geojson.py and generate-bus-stops.py.
+
+SearchRoute_v2 is queried once per leading character of the route numbers
+(e.g. 500-A, 500-B and 501-AC all share the query '5'), with all prefix queries
+running concurrently. Each result list is indexed in a trie over the upper-cased
+routeno values; every node remembers the first API entry below it, so both the
+exact match and the "first entry starting with the route's search text"
+fallback are resolved in one walk of the route number.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import bmtc_api
+from api_cache import fetch_cached
+
+# ──────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────
+
+SEARCH_CONCURRENCY = 8  # Concurrent SearchRoute_v2 prefix queries
+
+
+# ──────────────────────────────────────────────
+# SearchRoute_v2
+# ──────────────────────────────────────────────
+
+def fetch_search_results(prefix):
+    """Fetch SearchRoute_v2 results for a single-character prefix. Returns list of entries."""
+    try:
+        return fetch_cached(
+            f'SearchRoute_v2_{prefix}', prefix,
+            lambda: bmtc_api.post('SearchRoute_v2', json.dumps({"routetext": prefix}), timeout=30).json()
+        ).get('data', [])
+    except Exception as e:
+        print(f'  SearchRoute_v2 error for prefix "{prefix}": {e}')
+        return []
+
+
+# ──────────────────────────────────────────────
+# Route number trie
+# ──────────────────────────────────────────────
+
+def build_route_index(entries):
+    """Index SearchRoute_v2 entries by upper-cased routeno.
+
+    Each node is {'children': {char: node}, 'first': parent ID of the first entry
+    in this subtree, 'exact': parent ID of the first entry ending here (or None)}.
+    Entries are inserted in API order, so 'first' and 'exact' keep the earliest.
+    """
+    root = {'children': {}, 'first': None, 'exact': None}
+    for entry in entries:
+        parent_id = entry['routeparentid']
+        node = root
+        for ch in entry.get('routeno', '').upper():
+            if node['first'] is None:
+                node['first'] = parent_id
+            node = node['children'].setdefault(ch, {'children': {}, 'first': None, 'exact': None})
+        if node['first'] is None:
+            node['first'] = parent_id
+        if node['exact'] is None:
+            node['exact'] = parent_id
+    return root
+
+
+def _find_node(index, text):
+    node = index
+    for ch in text:
+        node = node['children'].get(ch)
+        if node is None:
+            return None
+    return node
+
+
+def lookup_parent_id(index, routeno):
+    """Exact routeno match, else the first entry starting with routeno's first word."""
+    node = _find_node(index, routeno.upper())
+    if node is not None and node['exact'] is not None:
+        return node['exact']
+    node = _find_node(index, routeno.split(' ')[0].upper())
+    return node['first'] if node is not None else None
+
+
+# ──────────────────────────────────────────────
+# Resolver
+# ──────────────────────────────────────────────
+
+def fetch_route_parent_ids(route_numbers, engine=None):
+    """Find the routeparentid of each route number. Returns dict: route number -> routeparentid.
+
+    With a FetchEngine the prefix queries run on it (and under its adaptive limit
+    in async mode); otherwise on a pool of SEARCH_CONCURRENCY threads.
+    """
+    groups = {}
+    for routeno in route_numbers:
+        if routeno:
+            groups.setdefault(routeno[0], []).append(routeno)
+
+    print(f'  Grouped into {len(groups)} prefix queries: {sorted(groups.keys())}')
+
+    def index_prefix(prefix):
+        return build_route_index(fetch_search_results(prefix))
+
+    prefixes = sorted(groups)
+    if engine is not None:
+        futures = [engine.submit(index_prefix, prefix) for prefix in prefixes]
+        indexes = [future.result() for future in futures]
+    else:
+        with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as pool:
+            indexes = list(pool.map(index_prefix, prefixes))
+
+    parent_ids = {}
+    for prefix, index in zip(prefixes, indexes):
+        for routeno in groups[prefix]:
+            parent_id = lookup_parent_id(index, routeno)
+            if parent_id is not None:
+                parent_ids[routeno] = parent_id
+
+    return parent_ids
@@ -0,0 +1,37 @@
+// Decoder for stop coordinates written by generate-geojson.py --encoded-coords.
+// Coordinates are packed with the polyline algorithm: fixed-point integers
+// (CoordPrecision decimal places) stored as zigzag-encoded deltas from the
+// previous point, in 5-bit chunks offset into printable ASCII.
+
+export function decodePolyline(encoded: string, precision: number): [number, number][] {
+    const factor = 10 ** precision;
+    const points: [number, number][] = [];
+    let index = 0;
+    let lat = 0;
+    let lon = 0;
+
+    const nextDelta = () => {
+        let result = 0;
+        let shift = 0;
+        let chunk: number;
+        do {
+            chunk = encoded.charCodeAt(index++) - 63;
+            result |= (chunk & 0x1f) << shift;
+            shift += 5;
+        } while (chunk >= 0x20);
+        return result & 1 ? ~(result >> 1) : result >> 1;
+    };
+
+    while (index < encoded.length) {
+        lat += nextDelta();
+        lon += nextDelta();
+        points.push([lat / factor, lon / factor]);
+    }
+    return points;
+}
+
+// Restore lat/lon on a stop list from its encoded coordinates (in place).
+export function decodeStopCoordinates<T extends object>(stops: T[], encoded: string, precision: number): (T & { lat: number; lon: number })[] {
+    const points = decodePolyline(encoded, precision);
+    return stops.map((stop, i) => Object.assign(stop, { lat: points[i][0], lon: points[i][1] }));
+}
@@ -0,0 +1,20 @@
+// Resolves data file names (e.g. 'stops-coordinates.json') to the files actually
+// published under /data. A release run of generate-geojson.py (--release) writes
+// content-hashed files plus /data/manifest.json mapping each name to its hashed
+// file; without a manifest (development output) names resolve unchanged.
+
+let manifestPromise: Promise<Record<string, string>> | null = null;
+
+function loadManifest(): Promise<Record<string, string>> {
+    if (!manifestPromise) {
+        manifestPromise = fetch('/data/manifest.json', { cache: 'no-cache' })
+            .then(r => (r.ok ? r.json() : {}))
+            .catch(() => ({}));
+    }
+    return manifestPromise;
+}
+
+export async function dataUrl(name: string): Promise<string> {
+    const manifest = await loadManifest();
+    return `/data/${manifest[name] ?? name}`;
+}
@@ -0,0 +1,66 @@
+// Loader for the per-platform stop shards written by generate-geojson.py --sharded.
+// The platforms file is then a light index: routes carry no "Stops", and each
+// feature names its shard in a "Shard" property. A shard holds
+// {Platform, Stops: {routeId: stops}} (or stop indices plus a "StopTable" when
+// --normalized is also used), with stop coordinates polyline-encoded under
+// --encoded-coords. Each shard is fetched at most once, and only when needed:
+// the map loads a platform's shard when it (or one of its routes) is opened, and
+// stop search asks for all of them through loadAllPlatformStops().
+
+import { decodeStopCoordinates } from './coordinates';
+import { dataUrl } from './manifest';
+import type { StopEntry } from './platformsGeojson';
+
+type StopsByRoute = Record<string, StopEntry[]>;
+
+const shardLoads = new Map<string, Promise<StopsByRoute>>();
+let allStopsLoader: (() => Promise<unknown>) | null = null;
+
+export function platformShard(feature: GeoJSON.Feature): string | null {
+    return feature.properties?.Shard ?? null;
+}
+
+// Registered by the map once the platforms index is loaded: fills every route's
+// stops (from all shards) into the routes store.
+export function setAllPlatformStopsLoader(loader: (() => Promise<unknown>) | null) {
+    allStopsLoader = loader;
+}
+
+// Resolves once every route's stops are available. A no-op for a non-sharded
+// platforms file, or before the map has loaded it (the routes it then sets
+// already carry their stops or will be loaded by a later call).
+export function loadAllPlatformStops(): Promise<unknown> {
+    return allStopsLoader ? allStopsLoader() : Promise.resolve();
+}
+
+export function loadPlatformShard(name: string): Promise<StopsByRoute> {
+    let load = shardLoads.get(name);
+    if (!load) {
+        load = dataUrl(name)
+            .then(url => fetch(url))
+            .then(r => r.json())
+            .then(shard => {
+                const precision: number | undefined = shard.CoordPrecision;
+                if (precision !== undefined) {
+                    if (shard.StopTable) {
+                        decodeStopCoordinates(shard.StopTable, shard.StopTableCoords, precision);
+                    } else {
+                        for (const [routeId, coords] of Object.entries(shard.StopCoords as Record<string, string>)) {
+                            decodeStopCoordinates(shard.Stops[routeId], coords, precision);
+                        }
+                    }
+                }
+                const stopTable: StopEntry[] | undefined = shard.StopTable;
+                if (!stopTable) return shard.Stops;
+                const stops: StopsByRoute = {};
+                for (const [routeId, indices] of Object.entries(shard.Stops as Record<string, number[]>)) {
+                    stops[routeId] = indices.map(i => stopTable[i]);
+                }
+                return stops;
+            });
+        // Let a failed shard be retried on the next request
+        load.catch(() => shardLoads.delete(name));
+        shardLoads.set(name, load);
+    }
+    return load;
+}
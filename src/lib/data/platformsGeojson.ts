@@ -0,0 +1,57 @@
+// Loader for the platforms-routes-*.geojson files written by generate-geojson.py.
+// The generator can write a normalized file (--normalized) with one shared
+// "StopTable" and per-route stop indices; it is expanded here so the rest of the
+// app always sees the original shape (full stop objects inside every route).
+// Stop coordinates polyline-encoded by --encoded-coords are decoded here too.
+
+import { decodeStopCoordinates } from './coordinates';
+import { dataUrl } from './manifest';
+
+export interface StopEntry {
+    name: string;
+    name_kn: string;
+    stop_id: string;
+    lat: number;
+    lon: number;
+}
+
+type PlatformsData = GeoJSON.FeatureCollection & {
+    StopTable?: StopEntry[];
+    StopTableCoords?: string;
+    CoordPrecision?: number;
+};
+
+export function expandPlatformsGeojson(data: PlatformsData): GeoJSON.FeatureCollection {
+    const precision = data.CoordPrecision;
+    if (precision !== undefined) {
+        if (data.StopTable && data.StopTableCoords !== undefined) {
+            decodeStopCoordinates(data.StopTable, data.StopTableCoords, precision);
+        } else {
+            for (const feature of data.features) {
+                for (const route of feature.properties?.Routes ?? []) {
+                    if (route.StopCoords === undefined) continue;
+                    decodeStopCoordinates(route.Stops, route.StopCoords, precision);
+                    delete route.StopCoords;
+                }
+            }
+        }
+        delete data.StopTableCoords;
+        delete data.CoordPrecision;
+    }
+
+    const stopTable = data.StopTable;
+    if (!stopTable) return data;
+
+    for (const feature of data.features) {
+        for (const route of feature.properties?.Routes ?? []) {
+            route.Stops = (route.Stops ?? []).map((i: number) => stopTable[i]);
+        }
+    }
+    delete data.StopTable;
+    return data;
+}
+
+export async function loadPlatformsGeojson(name: string): Promise<GeoJSON.FeatureCollection> {
+    const response = await fetch(await dataUrl(name));
+    return expandPlatformsGeojson(await response.json());
+}
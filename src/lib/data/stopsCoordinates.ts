@@ -0,0 +1,31 @@
+// Loader for stops-coordinates.json ({stop_id: {name, lat, lon}}), which the
+// search bars use to find stops near a place. With --encoded-coords the file
+// holds parallel "StopIds"/"Names" lists and one polyline ("Coords"); it is
+// decoded here so callers always see the original shape.
+
+import { decodePolyline } from './coordinates';
+import { dataUrl } from './manifest';
+
+export interface StopCoordinates {
+    name: string;
+    lat: number;
+    lon: number;
+}
+
+export type StopsCoordinates = Record<string, StopCoordinates>;
+
+export function expandStopsCoordinates(data: any): StopsCoordinates {
+    if (data.CoordPrecision === undefined) return data;
+
+    const points = decodePolyline(data.Coords, data.CoordPrecision);
+    const stops: StopsCoordinates = {};
+    data.StopIds.forEach((stopId: string, i: number) => {
+        stops[stopId] = { name: data.Names[i], lat: points[i][0], lon: points[i][1] };
+    });
+    return stops;
+}
+
+export async function loadStopsCoordinates(): Promise<StopsCoordinates> {
+    const response = await fetch(await dataUrl('stops-coordinates.json'));
+    return expandStopsCoordinates(await response.json());
+}
@@ -0,0 +1,104 @@
+// Nearest-stop search over stops-grid.json, the spatial index generate-geojson.py
+// writes next to stops-coordinates.json. Stops are bucketed into square lat/lon
+// cells ("row:col" = floor(lat / CellDegrees):floor(lon / CellDegrees)); a query
+// reads the cells in rings around the point's cell and stops once no unread cell
+// can hold a closer stop, so its cost follows the number of nearby stops rather
+// than the total.
+
+import { dataUrl } from './manifest';
+import type { StopCoordinates, StopsCoordinates } from './stopsCoordinates';
+
+type Bounds = [number, number, number, number]; // [minLat, minLon, maxLat, maxLon]
+
+export interface StopsGrid {
+    CellDegrees: number;
+    Bounds: Bounds | null;
+    Buckets: Record<string, { Bounds: Bounds; StopIds: string[] }>;
+}
+
+export interface NearbyStop extends StopCoordinates {
+    stopId: string;
+    distance: number; // meters
+}
+
+const EARTH_RADIUS_METERS = 6371000;
+const METERS_PER_DEGREE = EARTH_RADIUS_METERS * Math.PI / 180;
+
+export function distanceMeters(lat1: number, lon1: number, lat2: number, lon2: number): number {
+    const dLat = (lat2 - lat1) * Math.PI / 180;
+    const dLon = (lon2 - lon1) * Math.PI / 180;
+    const a = Math.sin(dLat / 2) * Math.sin(dLat / 2) +
+              Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
+              Math.sin(dLon / 2) * Math.sin(dLon / 2);
+    return EARTH_RADIUS_METERS * 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+}
+
+export async function loadStopsGrid(): Promise<StopsGrid> {
+    const response = await fetch(await dataUrl('stops-grid.json'));
+    return response.json();
+}
+
+// The `count` closest stops to (lat, lon) that pass `accept`, one per stop name
+// (the closest stop with that name), nearest first.
+export function nearestStops(
+    grid: StopsGrid,
+    stops: StopsCoordinates,
+    lat: number,
+    lon: number,
+    count: number,
+    accept: (stop: StopCoordinates, stopId: string) => boolean = () => true
+): NearbyStop[] {
+    if (!grid.Bounds || count <= 0) return [];
+
+    const cell = grid.CellDegrees;
+    const row = Math.floor(lat / cell);
+    const col = Math.floor(lon / cell);
+    // Rings beyond this one lie entirely outside the grid
+    const [minLat, minLon, maxLat, maxLon] = grid.Bounds;
+    const lastRing = Math.max(
+        row - Math.floor(minLat / cell), Math.floor(maxLat / cell) - row,
+        col - Math.floor(minLon / cell), Math.floor(maxLon / cell) - col
+    );
+
+    const best = new Map<string, NearbyStop>(); // stop name -> closest stop
+    let cutoff = Infinity; // distance of the count-th closest name so far
+
+    const visit = (key: string) => {
+        const bucket = grid.Buckets[key];
+        if (!bucket) return;
+        const [bMinLat, bMinLon, bMaxLat, bMaxLon] = bucket.Bounds;
+        const nearLat = Math.min(Math.max(lat, bMinLat), bMaxLat);
+        const nearLon = Math.min(Math.max(lon, bMinLon), bMaxLon);
+        if (distanceMeters(lat, lon, nearLat, nearLon) > cutoff) return;
+
+        for (const stopId of bucket.StopIds) {
+            const stop = stops[stopId];
+            if (!stop || !accept(stop, stopId)) continue;
+            const distance = distanceMeters(lat, lon, stop.lat, stop.lon);
+            const current = best.get(stop.name);
+            if (!current || distance < current.distance) {
+                best.set(stop.name, { ...stop, stopId, distance });
+            }
+        }
+        if (best.size >= count) {
+            cutoff = [...best.values()].map(s => s.distance).sort((a, b) => a - b)[count - 1];
+        }
+    };
+
+    for (let ring = 0; ring <= lastRing; ring++) {
+        // Stops in this ring and beyond are more than ring - 1 cells from the point
+        const lonScale = Math.cos(Math.min(Math.abs(lat) + ring * cell, 90) * Math.PI / 180);
+        if ((ring - 1) * cell * METERS_PER_DEGREE * lonScale > cutoff) break;
+
+        for (let r = row - ring; r <= row + ring; r++) {
+            if (r === row - ring || r === row + ring) {
+                for (let c = col - ring; c <= col + ring; c++) visit(`${r}:${c}`);
+            } else {
+                visit(`${r}:${col - ring}`);
+                visit(`${r}:${col + ring}`);
+            }
+        }
+    }
+
+    return [...best.values()].sort((a, b) => a.distance - b.distance).slice(0, count);
+}
@@ -9,6 +9,7 @@ export interface Route {
   destination: string;
   kannadaDestination?: string;
   platformNumber: string;
+  routeId?: number;
   // Add other fields as needed
 }
 
@@ -20,6 +21,7 @@ export class Route {
   destination: string;
   kannadaDestination?: string;
   platformNumber: string;
+  routeId?: number;
 
   constructor({
     number,
@@ -28,7 +30,8 @@ export class Route {
     via,
     destination,
     kannadaDestination,
-    platformNumber
+    platformNumber,
+    routeId
   }: {
     number: string;
     area: Area;
@@ -37,6 +40,7 @@ export class Route {
     destination: string;
     kannadaDestination?: string;
     platformNumber: string;
+    routeId?: number;
   }) {
     this.number = number;
     this.area = area;
@@ -45,6 +49,7 @@ export class Route {
     this.destination = destination;
     this.kannadaDestination = kannadaDestination;
     this.platformNumber = platformNumber;
+    this.routeId = routeId;
   }
 
   // displayName() {
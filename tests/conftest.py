@@ -0,0 +1,55 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def generate_geojson():
+    """generate-geojson.py loaded as a module (its file name is not importable)."""
+    spec = importlib.util.spec_from_file_location('generate_geojson', os.path.join(ROOT, 'generate-geojson.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def gtfs_folder(tmp_path):
+    """A small GTFS feed: trips through station stops S1/S2 plus one unrelated trip."""
+    folder = tmp_path / 'gtfs'
+    folder.mkdir()
+    stops = ['S1', 'S2', 'A', 'B', 'C', 'D', 'E', 'F', 'X', 'Y']
+    with open(folder / 'stops.txt', 'w', encoding='utf-8') as f:
+        f.write('stop_id,stop_name,stop_lat,stop_lon\n')
+        for i, stop_id in enumerate(stops):
+            f.write(f'{stop_id},Stop {stop_id},12.9{i:02d},77.5{i:02d}\n')
+    trips = {
+        't1': ['A', 'S1', 'B', 'C', 'D'],
+        't2': ['S1', 'C', 'E', 'F'],
+        't3': ['X', 'C', 'Y', 'F'],        # never serves the station
+        't4': ['B', 'S2', 'S2', 'E', 'A'],  # repeated consecutive stop
+        't5': ['S2', 'D', 'S1', 'B', 'X'],  # serves both station stops
+    }
+    with open(folder / 'stop_times.txt', 'w', encoding='utf-8') as f:
+        f.write('trip_id,arrival_time,departure_time,stop_id,stop_sequence\n')
+        for trip_id, sequence in trips.items():
+            # Written out of stop_sequence order to exercise the sort
+            for seq, stop_id in reversed(list(enumerate(sequence, start=1))):
+                f.write(f'{trip_id},08:00:00,08:00:00,{stop_id},{seq}\n')
+    return str(folder)
+
+
+@pytest.fixture
+def cache_db(tmp_path, monkeypatch):
+    """api_cache pointed at an empty database under tmp_path, with clean in-process state."""
+    import api_cache
+
+    api_cache.close()
+    monkeypatch.setattr(api_cache, 'CACHE_DB_PATH', str(tmp_path / 'api_cache.db'))
+    api_cache._memory.clear()
+    monkeypatch.setattr(api_cache, '_memory_bytes', 0)
+    yield api_cache
+    api_cache.close()
+    api_cache._memory.clear()
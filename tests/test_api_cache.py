@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+def make_stale(api_cache, desc, request_data, response):
+    """Store response for (desc, request_data) as if it was cached just past its TTL."""
+    cache_key = api_cache.get_cache_key(desc, request_data)
+    created_ts = int(time.time() - (api_cache.ttl_hours(desc) + 1) * 3600)
+    api_cache._memory_put(cache_key, (api_cache.encode_response(desc, response), created_ts, False))
+
+
+def test_stale_entry_is_revalidated_once_per_key(cache_db, monkeypatch):
+    monkeypatch.setattr(cache_db, 'STALE_WHILE_REVALIDATE', True)
+    cache_db.init_cache_db()
+    desc = 'SearchRoute_v2_500-D'
+    make_stale(cache_db, desc, '{}', {'Issuccess': True, 'data': [{'routeparentid': 1}]})
+
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'Issuccess': True, 'data': [{'routeparentid': 2}]}
+
+    for _ in range(20):
+        assert cache_db.fetch_cached(desc, '{}', fetch)['data'] == [{'routeparentid': 1}]
+    release.set()
+    cache_db.close()
+
+    assert len(calls) == 1
+    assert cache_db.fetch_cached(desc, '{}', fetch)['data'] == [{'routeparentid': 2}]
+
+
+def store_aged(api_cache, desc, request_data, response, age_hours):
+    """Commit response for (desc, request_data) with a created_at age_hours in the past."""
+    api_cache.store_cached_response(desc, request_data, response)
+    api_cache.flush()
+    api_cache.get_connection().execute(
+        f"UPDATE api_cache SET created_at = datetime('now', '-{age_hours} hours') WHERE request_hash = ?",
+        (api_cache.get_cache_key(desc, request_data),)
+    ).connection.commit()
+
+
+def test_cleanup_keeps_the_stale_window_only_in_stale_mode(cache_db, monkeypatch):
+    cache_db.init_cache_db()
+    desc = 'SearchRoute_v2_500-D'
+    past_ttl = cache_db.ttl_hours(desc) + 1
+
+    monkeypatch.setattr(cache_db, 'STALE_WHILE_REVALIDATE', True)
+    store_aged(cache_db, desc, '{}', {'Issuccess': True, 'data': []}, past_ttl)
+    cache_db.cleanup_expired_cache()
+    assert cache_db.count_entries() == 1
+
+    monkeypatch.setattr(cache_db, 'STALE_WHILE_REVALIDATE', False)
+    cache_db.cleanup_expired_cache()
+    assert cache_db.count_entries() == 0
+
+
+def test_migrates_original_text_cache(cache_db):
+    conn = sqlite3.connect(cache_db.CACHE_DB_PATH)
+    conn.execute('''
+        CREATE TABLE api_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_hash TEXT UNIQUE NOT NULL,
+            request_desc TEXT NOT NULL,
+            response_data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    desc = 'SearchRoute_v2_500-D'
+    full = {'Issuccess': True, 'Message': 'ok', 'RowCount': 1, 'data': [{'routeparentid': 7, 'routeno': '500-D', 'extra': 'x'}]}
+    failed = {'Issuccess': False, 'isException': True, 'Message': 'down'}
+    conn.executemany(
+        'INSERT INTO api_cache (request_hash, request_desc, response_data) VALUES (?, ?, ?)',
+        [
+            (cache_db.get_cache_key(desc, '{}'), desc, json.dumps(full)),
+            (cache_db.get_cache_key(desc, '{"x":1}'), desc, json.dumps(failed)),
+            ('broken', desc, 'not json'),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    cache_db.init_cache_db()
+
+    conn = cache_db.get_connection()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == cache_db.SCHEMA_VERSION
+    assert cache_db.count_entries() == 2
+    assert cache_db.get_cached_response(desc, '{}') == cache_db.project_response(desc, full)
+    assert conn.execute('SELECT is_failure FROM api_cache WHERE request_hash = ?',
+                        (cache_db.get_cache_key(desc, '{"x":1}'),)).fetchone() == (1,)
+
+
+def test_migrates_unflagged_compressed_cache(cache_db):
+    desc = 'SearchRoute_v2_500-D'
+    ok = {'Issuccess': True, 'data': [{'routeparentid': 7}]}
+    failed = {'Issuccess': False, 'isException': True}
+    conn = sqlite3.connect(cache_db.CACHE_DB_PATH)
+    conn.execute('''
+        CREATE TABLE api_cache (
+            request_hash TEXT PRIMARY KEY,
+            request_desc TEXT NOT NULL,
+            response BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO api_cache (request_hash, request_desc, response) VALUES (?, ?, ?)',
+        [
+            (cache_db.get_cache_key(desc, '{}'), desc, cache_db.encode_response(desc, ok)),
+            (cache_db.get_cache_key(desc, '{"x":1}'), desc, cache_db.encode_response(desc, failed)),
+        ]
+    )
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    cache_db.init_cache_db()
+
+    conn = cache_db.get_connection()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == cache_db.SCHEMA_VERSION
+    flags = dict(conn.execute('SELECT request_hash, is_failure FROM api_cache'))
+    assert flags == {cache_db.get_cache_key(desc, '{}'): 0, cache_db.get_cache_key(desc, '{"x":1}'): 1}
+    assert cache_db.get_cached_response(desc, '{}') == ok
+
+
+def test_stored_responses_round_trip_projected(cache_db):
+    cache_db.init_cache_db()
+    desc = 'GetAllRouteList_en'
+    response = {'Issuccess': True, 'data': [{'routeid': 1, 'routeno': '500-D', 'fromstationid': 20621, 'unused': 1}]}
+    cache_db.store_cached_response(desc, '{}', response)
+    cache_db.close()
+    cache_db._memory.clear()
+
+    assert cache_db.get_cached_response(desc, '{}') == {
+        'Issuccess': True, 'data': [{'routeid': 1, 'routeno': '500-D', 'fromstationid': 20621}]
+    }
@@ -0,0 +1,80 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The polyline algorithm's published example
+REFERENCE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+REFERENCE_ENCODED = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+def random_route(seed, count=200):
+    rng = random.Random(seed)
+    lat, lon = 12.9175, 77.5737
+    points = []
+    for _ in range(count):
+        lat += rng.uniform(-0.02, 0.02)
+        lon += rng.uniform(-0.02, 0.02)
+        points.append((round(lat, 5), round(lon, 5)))
+    return points
+
+
+@pytest.fixture(scope='module')
+def ts_decode(tmp_path_factory):
+    """Run src/lib/data/coordinates.ts's decodePolyline under Node (needs TypeScript type stripping)."""
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    probe = subprocess.run([node, '--experimental-strip-types', '-e', ''], capture_output=True)
+    if probe.returncode != 0:
+        pytest.skip('node cannot strip TypeScript types (needs Node 22.6+)')
+
+    script = tmp_path_factory.mktemp('ts') / 'decode.mts'
+    module = os.path.join(ROOT, 'src', 'lib', 'data', 'coordinates.ts')
+    script.write_text(
+        f'import {{ decodePolyline }} from {json.dumps(module)};\n'
+        'const [encoded, precision] = JSON.parse(process.argv[2]);\n'
+        'console.log(JSON.stringify(decodePolyline(encoded, precision)));\n'
+    )
+
+    def decode(encoded, precision):
+        result = subprocess.run(
+            [node, '--experimental-strip-types', '--no-warnings', str(script), json.dumps([encoded, precision])],
+            capture_output=True, text=True, check=True,
+        )
+        return [tuple(point) for point in json.loads(result.stdout)]
+
+    return decode
+
+
+def test_encoder_matches_the_reference_example(generate_geojson):
+    assert generate_geojson.encode_polyline(REFERENCE_POINTS) == REFERENCE_ENCODED
+
+
+def test_encoder_rounds_to_the_precision(generate_geojson):
+    encoded = generate_geojson.encode_polyline([(12.9175049, 77.5736529)], precision=5)
+    assert encoded == generate_geojson.encode_polyline([(12.9175, 77.57365)], precision=5)
+
+
+@pytest.mark.parametrize('precision', [5, 6])
+def test_typescript_decoder_round_trip(generate_geojson, ts_decode, precision):
+    points = REFERENCE_POINTS + random_route(precision)
+    decoded = ts_decode(generate_geojson.encode_polyline(points, precision), precision)
+    assert decoded == pytest.approx(points, abs=0.5 / 10 ** precision)
+
+
+def test_stops_coordinates_round_trip(generate_geojson, ts_decode):
+    points = random_route(0, count=50)
+    stops = {str(20000 + i): {'name': f'Stop {i}', 'lat': lat, 'lon': lon} for i, (lat, lon) in enumerate(points)}
+    encoded = generate_geojson.encode_stops_coordinates(stops)
+
+    decoded = ts_decode(encoded['Coords'], encoded['CoordPrecision'])
+    assert len(decoded) == len(encoded['StopIds']) == len(stops)
+    for stop_id, name, (lat, lon) in zip(encoded['StopIds'], encoded['Names'], decoded):
+        assert name == stops[stop_id]['name']
+        assert (lat, lon) == pytest.approx((stops[stop_id]['lat'], stops[stop_id]['lon']), abs=1e-6)
@@ -0,0 +1,65 @@
+import random
+
+from fetch_engine import ASYNC_INITIAL_CONCURRENCY, AdaptiveLimiter
+
+
+def test_limit_grows_under_latency_jitter_without_errors():
+    rng = random.Random(0)
+    for low, high in ((0.1, 0.5), (0.15, 0.6)):
+        limiter = AdaptiveLimiter()
+        for _ in range(2000):
+            limiter.observe(rng.uniform(low, high), True, 'GetTimetableByStation_v4')
+        assert limiter.limit > ASYNC_INITIAL_CONCURRENCY * 4
+
+
+def test_slow_endpoint_is_not_read_as_congestion():
+    rng = random.Random(1)
+    limiter = AdaptiveLimiter()
+    for _ in range(1000):
+        limiter.observe(rng.uniform(0.05, 0.1), True, 'GetTimetableByStation_v4')
+        limiter.observe(rng.uniform(2.0, 4.0), True, 'SearchByRouteDetails_v4')
+    assert limiter.limit > ASYNC_INITIAL_CONCURRENCY * 4
+
+
+def test_limit_backs_off_on_latency_spikes(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('fetch_engine.time.monotonic', lambda: clock[0])
+
+    limiter = AdaptiveLimiter(initial=32)
+    for _ in range(200):
+        clock[0] += 0.1
+        limiter.observe(0.1, True, 'GetTimetableByStation_v4')
+    grown = limiter.limit
+
+    for _ in range(3):
+        clock[0] += 1.0
+        limiter.observe(1.0, True, 'GetTimetableByStation_v4')
+    assert limiter.limit < grown
+
+
+def test_limit_backs_off_on_errors(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('fetch_engine.time.monotonic', lambda: clock[0])
+
+    limiter = AdaptiveLimiter(initial=32)
+    for _ in range(3):
+        clock[0] += 1.0
+        limiter.observe(30.0, False, 'GetTimetableByStation_v4')
+    assert limiter.limit < 32
+    assert limiter.errors == 3
+
+
+def test_backoff_cooldown_is_per_endpoint(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('fetch_engine.time.monotonic', lambda: clock[0])
+
+    limiter = AdaptiveLimiter(initial=32)
+    limiter.observe(1.0, True, 'GetTimetableByStation_v4')
+    limiter.observe(1.0, True, 'SearchByRouteDetails_v4')
+    limiter.observe(1.0, False, 'GetTimetableByStation_v4')
+    after_first = limiter.limit
+    # Same instant: still cooling down for this endpoint, but not for another one
+    limiter.observe(1.0, False, 'GetTimetableByStation_v4')
+    assert limiter.limit == after_first
+    limiter.observe(1.0, False, 'SearchByRouteDetails_v4')
+    assert limiter.limit < after_first
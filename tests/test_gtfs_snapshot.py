@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / 'gtfs_snapshot.bin')
+
+
+def test_snapshot_round_trip(generate_geojson, gtfs_folder, snapshot_path):
+    columns = generate_geojson.build_gtfs_snapshot(gtfs_folder)
+    feed_stat = generate_geojson.gtfs_feed_stat(gtfs_folder)
+    generate_geojson.write_gtfs_snapshot(snapshot_path, columns, feed_stat, 'hash')
+
+    header, loaded = generate_geojson.read_gtfs_snapshot(snapshot_path)
+    assert header['version'] == generate_geojson.GTFS_SNAPSHOT_VERSION
+    assert header['feed_stat'] == feed_stat
+    assert header['feed_hash'] == 'hash'
+    assert list(loaded) == list(generate_geojson.GTFS_SNAPSHOT_COLUMNS)
+    for name, column in columns.items():
+        assert loaded[name].tolist() == column.tolist(), name
+
+
+def test_snapshot_stop_info(generate_geojson, gtfs_folder, snapshot_path):
+    snapshot = generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert generate_geojson.snapshot_stop_info(snapshot, 'S2') == {'name': 'Stop S2', 'lat': 12.901, 'lon': 77.501}
+    assert generate_geojson.snapshot_stop_info(snapshot, 'missing') is None
+
+
+def test_snapshot_is_reused_until_the_feed_changes(generate_geojson, gtfs_folder, snapshot_path, capsys):
+    generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert 'Building GTFS snapshot' in capsys.readouterr().out
+
+    generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert 'Building GTFS snapshot' not in capsys.readouterr().out
+
+    # Same content, new mtime: reused, and the stored feed stat is refreshed
+    stop_times = os.path.join(gtfs_folder, 'stop_times.txt')
+    st = os.stat(stop_times)
+    os.utime(stop_times, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert 'Building GTFS snapshot' not in capsys.readouterr().out
+    header, _ = generate_geojson.read_gtfs_snapshot(snapshot_path)
+    assert header['feed_stat'] == generate_geojson.gtfs_feed_stat(gtfs_folder)
+
+    with open(stop_times, 'a', encoding='utf-8') as f:
+        f.write('t6,08:00:00,08:00:00,S1,1\n')
+    snapshot = generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert 'Building GTFS snapshot' in capsys.readouterr().out
+    assert len(snapshot['trip_offsets']) - 1 == 6
+
+
+@pytest.mark.parametrize('damage', ['truncate', 'garbage', 'empty'])
+def test_damaged_snapshot_is_rebuilt(generate_geojson, gtfs_folder, snapshot_path, capsys, damage):
+    generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    with open(snapshot_path, 'rb') as f:
+        data = f.read()
+    with open(snapshot_path, 'wb') as f:
+        if damage == 'truncate':
+            f.write(data[:len(data) // 2])
+        elif damage == 'garbage':
+            f.write(data[:12] + b'\xff' * (len(data) - 12))
+    capsys.readouterr()
+
+    snapshot = generate_geojson.load_gtfs_snapshot(gtfs_folder, snapshot_path)
+    assert 'Building GTFS snapshot' in capsys.readouterr().out
+    assert snapshot['stop_ids'][:2] == ['S1', 'S2']
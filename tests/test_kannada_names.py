@@ -0,0 +1,33 @@
+def test_ordinals_follow_the_curated_spelling(generate_geojson):
+    curated = {
+        '2nd Block Jayanagar': '2ನೇ ಬ್ಲಾಕ್ ಜಯನಗರ',
+        '3rd Block Jayanagar': '3ನೇ ಬ್ಲಾಕ್ ಜಯನಗರ',
+        '10th Cross Magadi Road': '10 ನೇ ಅಡ್ಡರಸ್ತೆ ಮಾಗಡಿ ರಸ್ತೆ',
+    }
+    kn_tokens = generate_geojson.learn_kannada_tokens(curated)
+    assert generate_geojson.compose_kannada_name('5th Block Jayanagar', kn_tokens) == '5ನೇ ಬ್ಲಾಕ್ ಜಯನಗರ'
+
+
+def test_tokens_need_more_than_one_aligned_occurrence(generate_geojson):
+    curated = {
+        'Madanayakanahalli': 'ಮಾದನಾಯಕನಹಳ್ಳಹಲ್ಲಿ',
+        'Jayanagar Circle': 'ಜಯನಗರ ವೃತ್ತ',
+        'Hebbal Circle': 'ಹೆಬ್ಬಾಳ ವೃತ್ತ',
+    }
+    kn_tokens = generate_geojson.learn_kannada_tokens(curated)
+    assert 'madanayakanahalli' not in kn_tokens
+    assert kn_tokens['circle'] == 'ವೃತ್ತ'
+
+
+def test_punctuation_is_stripped_before_counting(generate_geojson):
+    curated = {
+        'Peenya Bus Station (Basaveshwara)': 'ಪೀಣ್ಯ ಬಸ್ ನಿಲ್ದಾಣ (ಬಸವೇಶ್ವರ)',
+        'Basaveshwara Circle': 'ಬಸವೇಶ್ವರ ವೃತ್ತ',
+        'Kengeri Bus Station': 'ಕೆಂಗೇರಿ ಬಸ್ ನಿಲ್ದಾಣ',
+        'Kengeri Circle,': 'ಕೆಂಗೇರಿ ವೃತ್ತ,',
+    }
+    kn_tokens = generate_geojson.learn_kannada_tokens(curated)
+    assert kn_tokens['basaveshwara'] == 'ಬಸವೇಶ್ವರ'
+    assert kn_tokens['circle'] == 'ವೃತ್ತ'
+    assert generate_geojson.compose_kannada_name('Kengeri Bus Station (Basaveshwara)', kn_tokens) == 'ಕೆಂಗೇರಿ ಬಸ್ ನಿಲ್ದಾಣ (ಬಸವೇಶ್ವರ)'
+    assert generate_geojson.compose_kannada_name('Kengeri Circle,', kn_tokens) == 'ಕೆಂಗೇರಿ ವೃತ್ತ,'
@@ -0,0 +1,24 @@
+import time
+
+from fetch_engine import FetchEngine
+
+
+def test_routes_left_at_the_deadline_are_reported_as_skipped(generate_geojson, monkeypatch, capsys):
+    def slow_fetch_cached(desc, request_data, fetch):
+        time.sleep(0.2)
+        return {'Issuccess': True, 'data': [{'platformname': 'EAST', 'platformnumber': ''}]}
+
+    monkeypatch.setattr(generate_geojson, 'fetch_cached', slow_fetch_cached)
+    monkeypatch.setattr(generate_geojson, 'MISSING_ROUTES_CONCURRENCY', 2)
+    route_ids = list(range(1, 9))
+    engine = FetchEngine(mode='threads', max_workers=2)
+    try:
+        received = generate_geojson.fetch_missing_routes_by_id(route_ids, {}, {}, engine, deadline_seconds=0.3)
+    finally:
+        engine.close()
+
+    received_ids = [entry['route-id'] for entry in received]
+    assert 0 < len(received_ids) < len(route_ids)
+    skipped_line = next(line for line in capsys.readouterr().out.splitlines() if 'skipped' in line)
+    skipped_ids = [int(route_id) for route_id in skipped_line.split(': ')[1].split(', ')]
+    assert sorted(received_ids + skipped_ids) == route_ids
@@ -0,0 +1,65 @@
+import csv
+import os
+
+import pytest
+
+STATION = ['S1', 'S2']
+
+
+def baseline_next_stops(gtfs_folder, stop_ids, nest_level):
+    """The original per-trip walk over stop_times.txt that get_next_stops must reproduce."""
+    with open(os.path.join(gtfs_folder, 'stop_times.txt')) as f:
+        stop_times = list(csv.DictReader(f))
+    by_trip = {}
+    for st in stop_times:
+        by_trip.setdefault(st['trip_id'], []).append(st)
+    for rows in by_trip.values():
+        rows.sort(key=lambda x: int(x['stop_sequence']))
+
+    next_stops = {stop_id: [] for stop_id in stop_ids}
+    for stop_id in stop_ids:
+        for st in stop_times:
+            if st['stop_id'] != stop_id:
+                continue
+            rows = by_trip[st['trip_id']]
+            current = next(i for i, x in enumerate(rows) if x['stop_id'] == stop_id)
+            for offset in range(nest_level):
+                idx = current + offset
+                if idx >= len(rows) - 1:
+                    break
+                curr, nxt = rows[idx]['stop_id'], rows[idx + 1]['stop_id']
+                next_stops.setdefault(curr, [])
+                if nxt not in next_stops[curr]:
+                    next_stops[curr].append(nxt)
+    return next_stops
+
+
+@pytest.fixture
+def snapshot(generate_geojson, gtfs_folder, tmp_path):
+    return generate_geojson.load_gtfs_snapshot(gtfs_folder, str(tmp_path / 'snapshot.bin'))
+
+
+@pytest.mark.parametrize('nest_level', [0, 1, 2, 3, 4])
+def test_next_stops_match_baseline_walk(generate_geojson, gtfs_folder, snapshot, nest_level):
+    expected = baseline_next_stops(gtfs_folder, STATION, nest_level)
+    assert generate_geojson.get_next_stops(STATION, nest_level, snapshot=snapshot) == expected
+
+
+def test_next_stops_ignore_trips_that_skip_the_station(generate_geojson, snapshot):
+    next_stops = generate_geojson.get_next_stops(STATION, 3, snapshot=snapshot)
+    # t3 (X -> C -> Y) never serves the station, so C's only onward stops come from t1/t2
+    assert next_stops['C'] == ['D', 'E']
+    assert 'Y' not in next_stops
+
+
+def test_stop_graph_levels_follow_all_trips(generate_geojson, snapshot):
+    down = generate_geojson.stop_graph_levels(snapshot, ['S1'], 2)
+    assert [sorted(level) for level in down] == [['S1'], ['B', 'C'], ['D', 'E', 'S2', 'X', 'Y']]
+
+    up = generate_geojson.stop_graph_levels(snapshot, ['F'], 1, direction='up')
+    assert [sorted(level) for level in up] == [['F'], ['E', 'Y']]
+
+
+def test_stop_graph_drops_self_loops(generate_geojson, snapshot):
+    assert generate_geojson.stop_graph_neighbors(snapshot, 'S2') == ['D', 'E']
+    assert generate_geojson.stop_graph_neighbors(snapshot, 'S2', direction='up') == ['B']